@@ -1,17 +1,24 @@
 # 🚀 mcpComercialExt v1.3 - Aplicación Principal + NocoDB
 import os
+import json
 from datetime import datetime
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 import logging
 
 # Imports modulares
 from config import *
-from redash_service import get_clients_from_redash, search_client_by_document_with_availability, get_clients_summary
+from redash_service import (get_clients_from_redash, search_client_by_document_with_availability, get_clients_summary,
+                            start_cache_scheduler, load_cache_snapshots, get_shared_cache_status)
 from nocodb_service import (check_comercial_exists, create_comercial, get_comercial_info, 
-                           check_order_exists, process_order_assignment, get_comercial_by_cedula)
-from bot_handlers import setup_telegram_routes
-from utils import setup_webhook, validate_telegram_token
+                           check_order_exists, process_order_assignment, get_comercial_by_cedula,
+                           start_comerciales_replica, get_comerciales_replica_stats, process_bulk_order_assignment,
+                           parse_comerciales_csv, import_comerciales, start_assignment_journal,
+                           get_assignment_journal_stats)
+from bot_handlers import setup_telegram_routes, get_update_queue_stats, get_update_dedup_stats
+from utils import (setup_webhook, validate_telegram_token, get_single_flight_stats, start_telegram_dispatcher,
+                   get_telegram_dispatcher_stats)
+from resilience import get_circuit_breaker_stats, get_rate_limiter_stats
 
 # Configuración de logging
 logging.basicConfig(
@@ -79,7 +86,13 @@ def home():
             "comerciales": {
                 "/api/comerciales/check": "Verificar existencia de comercial",
                 "/api/comerciales/create": "Crear nuevo comercial",
-                "/api/comerciales/info": "Información de comercial"
+                "/api/comerciales/info": "Información de comercial",
+                "/api/comerciales/import": "Importación masiva (JSON o CSV)"
+            },
+            "orders": {
+                "/api/orders/check": "Verificar existencia de orden",
+                "/api/orders/assign": "Asignar orden a comercial",
+                "/api/orders/assign/bulk": "Asignación masiva de órdenes"
             },
             "system": {
                 "/health": "Estado del sistema",
@@ -145,6 +158,15 @@ def health():
             "cache_age_minutes": round((time.time() - clients_cache["timestamp"]) / 60, 1) if clients_cache["timestamp"] > 0 else 0,
             "nocodb_connection": "ok" if nocodb_test.get('success') else f"error: {nocodb_test.get('error')}"
         },
+        "webhook_queue": get_update_queue_stats(),
+        "webhook_dedup": get_update_dedup_stats(),
+        "telegram_dispatcher": get_telegram_dispatcher_stats(),
+        "single_flight": get_single_flight_stats(),
+        "shared_cache": get_shared_cache_status(),
+        "comerciales_replica": get_comerciales_replica_stats(),
+        "assignment_journal": get_assignment_journal_stats(),
+        "circuit_breakers": get_circuit_breaker_stats(),
+        "rate_limiters": get_rate_limiter_stats(),
         "last_check": datetime.now().isoformat()
     })
 
@@ -181,7 +203,7 @@ def api_clients():
         
         # Incluir muestra de datos si se solicita
         if include_sample:
-            response["sample_clients"] = clients[:5]  # Primeros 5 como muestra
+            response["sample_clients"] = [dict(client) for client in clients[:5]]  # Primeros 5 como muestra
         
         return jsonify(response)
         
@@ -322,6 +344,43 @@ def api_comercial_info():
         logger.error(f"❌ API comercial info error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/comerciales/import', methods=['POST'])
+def api_import_comerciales():
+    """API para importar comerciales desde un arreglo JSON o un CSV; responde NDJSON por fila"""
+    try:
+        upload = request.files.get('file')
+        
+        if upload is not None:
+            rows = parse_comerciales_csv(upload.read().decode('utf-8', errors='replace'))
+        elif request.mimetype == 'text/csv':
+            rows = parse_comerciales_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            rows = data.get('comerciales') if isinstance(data, dict) else data
+        
+        if not isinstance(rows, list) or not rows:
+            return jsonify({
+                "error": "Se requiere un arreglo JSON o un archivo CSV con comerciales",
+                "required_fields": ['cedula', 'email', 'name', 'phone'],
+                "example": {
+                    "comerciales": [
+                        {"cedula": "12345678", "email": "comercial@empresa.com", "name": "Juan Pérez", "phone": "3001234567"}
+                    ]
+                },
+                "csv_example": "cedula,email,name,phone\n12345678,comercial@empresa.com,Juan Pérez,3001234567"
+            }), 400
+        
+        if len(rows) > IMPORT_MAX_ROWS:
+            return jsonify({"error": f"Máximo {IMPORT_MAX_ROWS} filas por importación"}), 400
+        
+        # Reporte en streaming: una línea JSON por fila procesada y un resumen al final
+        report = (json.dumps(line, ensure_ascii=False) + "\n" for line in import_comerciales(rows))
+        return Response(stream_with_context(report), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        logger.error(f"❌ API import comerciales error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # ===== API ENDPOINTS ÓRDENES =====
 
 @app.route('/api/orders/check', methods=['GET'])
@@ -335,8 +394,11 @@ def api_check_order():
             "example": "/api/orders/check?order_number=MP-0003"
         }), 400
     
+    # count_only=true: solo existencia, sin traer el registro de la orden
+    count_only = request.args.get('count_only', 'false').lower() == 'true'
+    
     try:
-        result = check_order_exists(order_number)
+        result = check_order_exists(order_number, count_only=count_only)
         
         if result.get("success"):
             return jsonify(result)
@@ -383,6 +445,42 @@ def api_assign_order():
         logger.error(f"❌ API assign order error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/orders/assign/bulk', methods=['POST'])
+def api_assign_orders_bulk():
+    """API para asignar varias órdenes a comerciales en una sola solicitud"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({"error": "JSON data requerido"}), 400
+        
+        items = data.get('assignments') if isinstance(data, dict) else data
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                "error": "Se requiere una lista de asignaciones",
+                "example": {
+                    "assignments": [
+                        {"cedula": "12345678", "order_number": "MP-0003"},
+                        {"cedula": "87654321", "order_number": "MP-0004"}
+                    ]
+                }
+            }), 400
+        
+        if len(items) > BULK_ASSIGN_MAX_ITEMS:
+            return jsonify({"error": f"Máximo {BULK_ASSIGN_MAX_ITEMS} asignaciones por solicitud"}), 400
+        
+        result = process_bulk_order_assignment(items)
+        
+        if result.get("success"):
+            return jsonify(result), 207 if result.get("failed") else 201
+        else:
+            return jsonify(result), 500
+            
+    except Exception as e:
+        logger.error(f"❌ API bulk assign error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/orders/process', methods=['POST'])
 def api_process_order():
     """API para procesar asignación completa (comercial + orden)"""
@@ -488,8 +586,19 @@ def setup_webhook_endpoint():
 
 # ===== CONFIGURACIÓN BOT =====
 
-# Registrar rutas del bot
+# Registrar rutas del bot e iniciar la cola de salida de mensajes
 setup_telegram_routes(app)
+start_telegram_dispatcher()
+
+# Cargar snapshots en disco y refrescar caches de Redash en segundo plano (también bajo gunicorn)
+load_cache_snapshots()
+start_cache_scheduler()
+
+# Cargar y reconciliar la réplica local de comerciales
+start_comerciales_replica()
+
+# Reenviar asignaciones pendientes del journal y drenar las nuevas (si la escritura diferida está activa)
+start_assignment_journal()
 
 # ===== MAIN =====
 
@@ -0,0 +1,255 @@
+# 📒 assignment_journal.py - Journal Local de Asignaciones (Escritura Diferida) v1.0
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Líneas del journal (JSONL): {"op": "enqueue", "id", "payload", "context", "created_at"}
+# y {"op": "ack", "id", "status": "done" | "failed"}. Lo que no tiene ack se reenvía al iniciar.
+# La entrega es al menos una vez: si el proceso muere entre el POST y el ack, se reenvía.
+# Antes de reenviar una entrada reintentada o reproducida se consulta check_delivered, así
+# un POST que NocoDB ya guardó (timeout de lectura, caída antes del ack) no crea otra fila.
+
+class AssignmentJournal:
+    """Cola durable en disco que se drena por lotes hacia NocoDB en segundo plano"""
+
+    def __init__(self, path, send_batch, on_failure, batch_size, max_attempts, retry_interval,
+                 linger=1.0, compact_after=1000, check_delivered=None):
+        self.path = path
+        self._send_batch = send_batch
+        self._on_failure = on_failure
+        self._check_delivered = check_delivered
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_interval = retry_interval
+        self.linger = linger
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._handle = None
+        self._thread = None
+        self._pending = OrderedDict()  # id -> entrada (con attempts y next_attempt en memoria)
+        self._acked_lines = 0
+        self._stats = {"enqueued": 0, "delivered": 0, "failed": 0, "retries": 0, "batches": 0,
+                       "replayed": 0, "already_delivered": 0, "last_error": None}
+
+    # ===== ARRANQUE =====
+
+    def start(self):
+        """Reproducir el journal, compactarlo e iniciar el hilo de drenado"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+
+        with self._lock:
+            pending = self._replay()
+            self._pending = OrderedDict((entry["id"], entry) for entry in pending)
+            self._rewrite(pending)
+            self._stats["replayed"] = len(pending)
+
+        self._thread = threading.Thread(target=self._drain_loop, name="assignment-journal", daemon=True)
+        self._thread.start()
+        logger.info(f"📒 Assignment journal started at {self.path} ({len(pending)} pending)")
+        return True
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _replay(self):
+        """Entradas sin ack, en el orden en que se registraron"""
+        if not os.path.exists(self.path):
+            return []
+
+        pending = OrderedDict()
+        with open(self.path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Última línea truncada por una caída a mitad de escritura
+                    logger.warning(f"⚠️ Skipping corrupt journal line in {self.path}")
+                    continue
+                if record.get("op") == "enqueue":
+                    pending[record["id"]] = record
+                elif record.get("op") == "ack":
+                    pending.pop(record.get("id"), None)
+
+        for entry in pending.values():
+            entry["attempts"] = 0
+            entry["next_attempt"] = 0
+            # El POST pudo ejecutarse sin que el ack llegara a disco
+            entry["verify"] = True
+        return list(pending.values())
+
+    def _rewrite(self, pending):
+        """Reemplazar el journal (atómico) dejando solo las entradas pendientes"""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".journal-", dir=directory)
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                for entry in pending:
+                    handle.write(self._encode(self._enqueue_record(entry)))
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self._handle is not None:
+            self._handle.close()
+        self._handle = open(self.path, "a", encoding="utf-8")
+        self._acked_lines = 0
+
+    # ===== ESCRITURA =====
+
+    @staticmethod
+    def _encode(record):
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + "\n"
+
+    @staticmethod
+    def _enqueue_record(entry):
+        return {key: entry[key] for key in ("op", "id", "payload", "context", "created_at")}
+
+    def _write(self, record):
+        """Agregar una línea y forzarla a disco (llamar con el lock tomado)"""
+        self._handle.write(self._encode(record))
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+    def append(self, payload, context=None):
+        """Registrar una asignación de forma durable; retorna su id cuando ya está en disco"""
+        entry = {
+            "op": "enqueue",
+            "id": uuid.uuid4().hex,
+            "payload": payload,
+            "context": context or {},
+            "created_at": time.time()
+        }
+
+        with self._lock:
+            if self._handle is None:
+                raise RuntimeError("Journal de asignaciones no iniciado")
+            self._write(self._enqueue_record(entry))
+            entry["attempts"] = 0
+            entry["next_attempt"] = 0
+            entry["verify"] = False
+            self._pending[entry["id"]] = entry
+            self._stats["enqueued"] += 1
+            self._wakeup.notify()
+
+        return entry["id"]
+
+    def _ack(self, entry, status):
+        """Marcar una entrada como entregada o descartada (llamar con el lock tomado)"""
+        self._write({"op": "ack", "id": entry["id"], "status": status})
+        self._pending.pop(entry["id"], None)
+        self._acked_lines += 1
+
+    # ===== DRENADO =====
+
+    def _next_batch(self):
+        """Entradas listas para enviar, esperando a que haya trabajo (llamar con el lock tomado)"""
+        while True:
+            now = time.time()
+            ready = [entry for entry in self._pending.values() if entry["next_attempt"] <= now]
+            if ready:
+                return ready[:self.batch_size]
+
+            waits = [entry["next_attempt"] - now for entry in self._pending.values()]
+            self._wakeup.wait(timeout=min(waits) if waits else None)
+
+    def _drain_loop(self):
+        """Enviar lotes a NocoDB; reintentar con backoff y avisar las fallas definitivas"""
+        while True:
+            try:
+                with self._lock:
+                    self._next_batch()
+
+                # Esperar un poco para acumular asignaciones confirmadas casi al mismo tiempo
+                time.sleep(self.linger)
+
+                with self._lock:
+                    batch = self._next_batch()
+
+                self._deliver(batch)
+
+            except Exception as e:
+                logger.error(f"❌ Assignment journal drain error: {e}")
+                time.sleep(self.retry_interval)
+
+    def _deliver(self, batch):
+        """Descartar las entradas que NocoDB ya tiene y enviar el resto del lote"""
+        unconfirmed = [entry for entry in batch if entry["verify"]]
+        if unconfirmed and self._check_delivered is not None:
+            # Si la consulta falla se propaga: nada se reenvía hasta poder verificar
+            delivered = self._check_delivered([entry["payload"] for entry in unconfirmed])
+            present = {entry["id"] for entry, found in zip(unconfirmed, delivered) if found}
+
+            if present:
+                with self._lock:
+                    for entry in batch:
+                        if entry["id"] in present:
+                            self._ack(entry, "done")
+                            self._stats["delivered"] += 1
+                            self._stats["already_delivered"] += 1
+                logger.info(f"📒 {len(present)} journaled assignments already in NocoDB, not resent")
+                batch = [entry for entry in batch if entry["id"] not in present]
+
+        if batch:
+            results = self._send_batch([entry["payload"] for entry in batch])
+            self._handle_results(batch, results)
+
+    def _handle_results(self, batch, results):
+        failed = []
+
+        with self._lock:
+            self._stats["batches"] += 1
+
+            for entry, result in zip(batch, results):
+                if result.get("success"):
+                    self._ack(entry, "done")
+                    self._stats["delivered"] += 1
+                    continue
+
+                entry["attempts"] += 1
+                entry["verify"] = True
+                self._stats["last_error"] = result.get("error")
+
+                if not result.get("retryable", True) or entry["attempts"] >= self.max_attempts:
+                    self._ack(entry, "failed")
+                    self._stats["failed"] += 1
+                    failed.append((entry, result.get("error")))
+                else:
+                    self._stats["retries"] += 1
+                    delay = min(self.retry_interval * (2 ** (entry["attempts"] - 1)), 300)
+                    entry["next_attempt"] = time.time() + delay
+
+            if self._acked_lines >= self.compact_after:
+                self._rewrite(list(self._pending.values()))
+
+        if failed:
+            logger.error(f"❌ {len(failed)} journaled assignments failed permanently")
+        for entry, error in failed:
+            try:
+                self._on_failure(entry, error)
+            except Exception as e:
+                logger.error(f"❌ Error notifying failed assignment {entry['id']}: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            oldest = next(iter(self._pending.values()), None)
+            return dict(
+                self._stats,
+                pending=len(self._pending),
+                oldest_pending_seconds=round(time.time() - oldest["created_at"], 1) if oldest else None,
+                running=self.is_running()
+            )
@@ -7,58 +7,102 @@ from nocodb_service import (check_comercial_exists, create_comercial, validate_e
                           validate_cedula_format, validate_name_format, validate_phone_format, 
                           format_comercial_info, validate_order_number_format, get_comercial_by_cedula,
                           check_order_exists, process_order_assignment)
-from utils import send_telegram_message
+from utils import send_telegram_message, send_progress_message, deliver_result
+from webhook_queue import UpdateQueue, RecentUpdateIds
 
 logger = logging.getLogger(__name__)
 
 # Variables globales para estados de usuario
 user_states = {}
 
+def process_telegram_update(update_data):
+    """Procesar un update de Telegram (en un worker de la cola o directo en el webhook)"""
+    if not update_data or 'message' not in update_data:
+        return
+    
+    message = update_data['message']
+    chat_id = message['chat']['id']
+    user_id = message['from']['id']
+    
+    if 'text' not in message:
+        return
+    
+    text = message['text'].strip()
+    text_lower = text.lower()
+    
+    # Router de comandos
+    if text in ['/start', 'start', 'inicio', 'hola']:
+        handle_start_command(chat_id)
+    elif text in ['/help', 'help', 'ayuda']:
+        handle_help_command(chat_id)
+    elif text_lower in ['/cliente', 'cliente', 'buscar', 'search']:
+        handle_client_search_start(chat_id, user_id)
+    elif text_lower in ['/crear', 'crear', 'nuevo', 'registrar']:
+        handle_create_comercial_start(chat_id, user_id)
+    elif text_lower in ['/orden', 'orden', 'asignar', 'assignment']:
+        handle_order_assignment_start(chat_id, user_id)
+    elif text_lower in ['/resumen', 'resumen', 'estadisticas', 'stats']:
+        handle_stats_command(chat_id)
+    elif text_lower in ['/info', 'info', 'detalle', 'detalles']:
+        handle_info_command(chat_id)
+    elif text_lower in ['nit', 'cc'] and user_id in user_states and user_states[user_id].get('process') == 'client_search':
+        handle_document_type_selection(chat_id, user_id, text.upper())
+    else:
+        # Manejar estados de conversación
+        if user_id in user_states:
+            handle_conversation_state(chat_id, user_id, text)
+        else:
+            handle_unknown_command(chat_id, text)
+
+def update_user_key(update_data):
+    """Clave de orden de un update: el usuario (user_states es por user_id), o el chat"""
+    message = (update_data or {}).get('message') or {}
+    return (message.get('from') or {}).get('id') or (message.get('chat') or {}).get('id')
+
+# Updates procesados fuera del request del webhook (Telegram recibe 200 de inmediato),
+# en orden por usuario para no mezclar pasos de los flujos crear/orden/cliente
+update_queue = UpdateQueue(process_telegram_update, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, key=update_user_key)
+
+# Telegram reintenta el mismo update si el webhook tarda; se descarta por update_id
+# (por proceso: con varios workers de gunicorn cada uno ve solo los updates que recibe)
+recent_updates = RecentUpdateIds(WEBHOOK_DEDUP_WINDOW, WEBHOOK_DEDUP_MAX_IDS)
+
+def get_update_dedup_stats():
+    """Reenvíos descartados por update_id para /health"""
+    return recent_updates.get_stats()
+
+def get_update_queue_stats():
+    """Estado de la cola de updates para /health"""
+    if not WEBHOOK_ASYNC:
+        return {"enabled": False}
+    return dict(update_queue.get_stats(), enabled=True)
+
 def setup_telegram_routes(app):
     """Configurar rutas del bot de Telegram"""
     
+    if WEBHOOK_ASYNC:
+        update_queue.start()
+    
     @app.route('/telegram-webhook', methods=['POST'])
     def telegram_webhook():
         """Webhook para recibir mensajes de Telegram"""
         try:
             update_data = request.get_json()
             
-            if not update_data or 'message' not in update_data:
+            update_id = (update_data or {}).get('update_id')
+            if update_id is not None and recent_updates.check_and_add(update_id):
+                logger.info(f"🔁 Duplicate update {update_id} suppressed")
                 return "OK", 200
             
-            message = update_data['message']
-            chat_id = message['chat']['id']
-            user_id = message['from']['id']
-            
-            if 'text' not in message:
+            if not WEBHOOK_ASYNC:
+                process_telegram_update(update_data)
                 return "OK", 200
             
-            text = message['text'].strip()
-            text_lower = text.lower()
-            
-            # Router de comandos
-            if text in ['/start', 'start', 'inicio', 'hola']:
-                handle_start_command(chat_id)
-            elif text in ['/help', 'help', 'ayuda']:
-                handle_help_command(chat_id)
-            elif text_lower in ['/cliente', 'cliente', 'buscar', 'search']:
-                handle_client_search_start(chat_id, user_id)
-            elif text_lower in ['/crear', 'crear', 'nuevo', 'registrar']:
-                handle_create_comercial_start(chat_id, user_id)
-            elif text_lower in ['/orden', 'orden', 'asignar', 'assignment']:
-                handle_order_assignment_start(chat_id, user_id)
-            elif text_lower in ['/resumen', 'resumen', 'estadisticas', 'stats']:
-                handle_stats_command(chat_id)
-            elif text_lower in ['/info', 'info', 'detalle', 'detalles']:
-                handle_info_command(chat_id)
-            elif text_lower in ['nit', 'cc'] and user_id in user_states and user_states[user_id].get('process') == 'client_search':
-                handle_document_type_selection(chat_id, user_id, text.upper())
-            else:
-                # Manejar estados de conversación
-                if user_id in user_states:
-                    handle_conversation_state(chat_id, user_id, text)
-                else:
-                    handle_unknown_command(chat_id, text)
+            # Cola llena: 503 para que Telegram reintente más tarde en vez de perder el mensaje
+            if not update_queue.submit(update_data):
+                if update_id is not None:
+                    recent_updates.discard(update_id)
+                return "Busy", 503
             
             return "OK", 200
             
@@ -427,14 +471,14 @@ def handle_cedula_input(chat_id, user_id, cedula):
     
     state = user_states[user_id]
     
-    # Enviar mensaje de verificación
-    send_telegram_message(chat_id, f"🔍 Verificando cédula: {cedula}...\n⏳ Un momento por favor")
+    # Enviar mensaje de verificación (se edita con el resultado)
+    progress = send_progress_message(chat_id, f"🔍 Verificando cédula: {cedula}...\n⏳ Un momento por favor")
     
     try:
         # Validar formato de cédula
         validation = validate_cedula_format(cedula)
         if not validation["valid"]:
-            send_telegram_message(chat_id, f"❌ **Formato incorrecto:**\n{validation['error']}\n\n📝 **Intenta nuevamente:**", parse_mode='Markdown')
+            deliver_result(chat_id, progress, f"❌ **Formato incorrecto:**\n{validation['error']}\n\n📝 **Intenta nuevamente:**", parse_mode='Markdown')
             return
         
         clean_cedula = validation["cleaned_cedula"]
@@ -443,7 +487,7 @@ def handle_cedula_input(chat_id, user_id, cedula):
         exists_check = check_comercial_exists(clean_cedula)
         
         if not exists_check["success"]:
-            send_telegram_message(chat_id, f"❌ **Error verificando cédula:**\n{exists_check['error']}\n\n📝 **Intenta nuevamente:**")
+            deliver_result(chat_id, progress, f"❌ **Error verificando cédula:**\n{exists_check['error']}\n\n📝 **Intenta nuevamente:**")
             return
         
         if exists_check["exists"]:
@@ -463,7 +507,7 @@ def handle_cedula_input(chat_id, user_id, cedula):
 
 🔄 **Nueva acción:** Escribe 'crear' para intentar con otra cédula"""
             
-            send_telegram_message(chat_id, response, parse_mode='Markdown')
+            deliver_result(chat_id, progress, response, parse_mode='Markdown')
             
             # Limpiar estado
             del user_states[user_id]
@@ -471,6 +515,7 @@ def handle_cedula_input(chat_id, user_id, cedula):
         
         # Cédula disponible, continuar con email
         state['data']['cedula'] = clean_cedula
+        state['data']['cedula_lookup'] = exists_check.get("verified_lookup")
         state['step'] = 'email'
         
         text = f"""✅ **CÉDULA DISPONIBLE:** {clean_cedula}
@@ -491,11 +536,11 @@ def handle_cedula_input(chat_id, user_id, cedula):
 
 📝 **Ingresa el email:**"""
         
-        send_telegram_message(chat_id, text, parse_mode='Markdown')
+        deliver_result(chat_id, progress, text, parse_mode='Markdown')
         
     except Exception as e:
         logger.error(f"Cedula input error: {e}")
-        send_telegram_message(chat_id, f"❌ **Error procesando cédula:**\nNo pude verificar la cédula en este momento.\n\n📝 **Intenta nuevamente:**")
+        deliver_result(chat_id, progress, f"❌ **Error procesando cédula:**\nNo pude verificar la cédula en este momento.\n\n📝 **Intenta nuevamente:**")
 
 def handle_email_input(chat_id, user_id, email):
     """Manejar entrada de email para comercial"""
@@ -635,15 +680,15 @@ def handle_comercial_cedula_input(chat_id, user_id, cedula):
     
     state = user_states[user_id]
     
-    # Enviar mensaje de verificación
-    send_telegram_message(chat_id, f"🔍 Verificando comercial con cédula: {cedula}...\n⏳ Un momento por favor")
+    # Enviar mensaje de verificación (se edita con el resultado)
+    progress = send_progress_message(chat_id, f"🔍 Verificando comercial con cédula: {cedula}...\n⏳ Un momento por favor")
     
     try:
         # Verificar si el comercial existe y obtener ID
         result = get_comercial_by_cedula(cedula)
         
         if not result.get("success"):
-            send_telegram_message(chat_id, f"❌ **Error verificando comercial:**\n{result.get('error')}\n\n📝 **Intenta nuevamente:**")
+            deliver_result(chat_id, progress, f"❌ **Error verificando comercial:**\n{result.get('error')}\n\n📝 **Intenta nuevamente:**")
             return
         
         if not result.get("found"):
@@ -663,7 +708,7 @@ La cédula **{cedula}** no está registrada en el sistema.
 
 📝 **¿Quieres intentar con otra cédula?** Ingresa la cédula:"""
             
-            send_telegram_message(chat_id, response, parse_mode='Markdown')
+            deliver_result(chat_id, progress, response, parse_mode='Markdown')
             return
         
         # Comercial encontrado, guardar datos y continuar
@@ -673,6 +718,7 @@ La cédula **{cedula}** no está registrada en el sistema.
         state['data']['comercial_cedula'] = cedula
         state['data']['comercial_id'] = comercial_id
         state['data']['comercial_data'] = comercial_data
+        state['data']['comercial_lookup'] = result.get("verified_lookup")
         state['step'] = 'order_number'
         
         formatted_info = format_comercial_info(comercial_data)
@@ -697,11 +743,11 @@ La cédula **{cedula}** no está registrada en el sistema.
 
 📝 **Ingresa el número de orden:**"""
         
-        send_telegram_message(chat_id, text, parse_mode='Markdown')
+        deliver_result(chat_id, progress, text, parse_mode='Markdown')
         
     except Exception as e:
         logger.error(f"Comercial cedula input error: {e}")
-        send_telegram_message(chat_id, f"❌ **Error procesando cédula:**\nNo pude verificar el comercial en este momento.\n\n📝 **Intenta nuevamente:**")
+        deliver_result(chat_id, progress, f"❌ **Error procesando cédula:**\nNo pude verificar el comercial en este momento.\n\n📝 **Intenta nuevamente:**")
 
 def handle_order_number_input(chat_id, user_id, order_number):
     """Manejar entrada de número de orden"""
@@ -709,15 +755,15 @@ def handle_order_number_input(chat_id, user_id, order_number):
     
     state = user_states[user_id]
     
-    # Enviar mensaje de verificación
-    send_telegram_message(chat_id, f"📦 Verificando orden: {order_number}...\n⏳ Un momento por favor")
+    # Enviar mensaje de verificación (se edita con el resultado)
+    progress = send_progress_message(chat_id, f"📦 Verificando orden: {order_number}...\n⏳ Un momento por favor")
     
     try:
         # Verificar que la orden existe
         result = check_order_exists(order_number)
         
         if not result.get("success"):
-            send_telegram_message(chat_id, f"❌ **Error verificando orden:**\n{result.get('error')}\n\n📝 **Intenta nuevamente:**")
+            deliver_result(chat_id, progress, f"❌ **Error verificando orden:**\n{result.get('error')}\n\n📝 **Intenta nuevamente:**")
             return
         
         if not result.get("exists"):
@@ -736,7 +782,7 @@ La orden **{normalized_order}** no existe en el sistema.
 
 📝 **¿Quieres intentar con otro número?** Ingresa la orden:"""
             
-            send_telegram_message(chat_id, response, parse_mode='Markdown')
+            deliver_result(chat_id, progress, response, parse_mode='Markdown')
             return
         
         # Orden encontrada, preparar confirmación
@@ -745,6 +791,7 @@ La orden **{normalized_order}** no existe en el sistema.
         
         state['data']['order_number'] = normalized_order
         state['data']['order_data'] = order_data
+        state['data']['order_lookup'] = result.get("verified_lookup")
         state['step'] = 'assignment_confirm'
         
         comercial_data = state['data']['comercial_data']
@@ -767,11 +814,11 @@ La orden **{normalized_order}** no existe en el sistema.
 
 💡 **Nota:** Una vez confirmado, la orden será asignada al comercial."""
         
-        send_telegram_message(chat_id, text, parse_mode='Markdown')
+        deliver_result(chat_id, progress, text, parse_mode='Markdown')
         
     except Exception as e:
         logger.error(f"Order number input error: {e}")
-        send_telegram_message(chat_id, f"❌ **Error procesando orden:**\nNo pude verificar la orden en este momento.\n\n📝 **Intenta nuevamente:**")
+        deliver_result(chat_id, progress, f"❌ **Error procesando orden:**\nNo pude verificar la orden en este momento.\n\n📝 **Intenta nuevamente:**")
 
 def handle_assignment_confirmation(chat_id, user_id, confirmation):
     """Manejar confirmación de asignación de orden"""
@@ -782,7 +829,7 @@ def handle_assignment_confirmation(chat_id, user_id, confirmation):
     
     if confirmation_lower in ['si', 'sí', 'yes', 'confirmar', 'confirmo', 'ok', 'vale']:
         # Confirmar asignación
-        send_telegram_message(chat_id, "🎯 **Asignando orden...**\n⏳ *Un momento por favor*")
+        progress = send_progress_message(chat_id, "🎯 **Asignando orden...**\n⏳ *Un momento por favor*")
         
         try:
             data = state['data']
@@ -790,12 +837,20 @@ def handle_assignment_confirmation(chat_id, user_id, confirmation):
             # Procesar asignación completa
             result = process_order_assignment(
                 cedula=data['comercial_cedula'],
-                order_number=data['order_number']
+                order_number=data['order_number'],
+                comercial_token=data.get('comercial_lookup'),
+                order_token=data.get('order_lookup'),
+                write_behind=ASSIGNMENT_WRITE_BEHIND,
+                notify_chat_id=chat_id
             )
             
             if result["success"]:
                 # Éxito
                 details = result["details"]
+                if details.get('queued'):
+                    status_line = "**✅ Estado:** Asignación registrada; se confirmará en el sistema en unos segundos (te avisaré si falla)"
+                else:
+                    status_line = "**✅ Estado:** Orden asignada y activa en el sistema"
                 
                 response = f"""✅ **¡ORDEN ASIGNADA EXITOSAMENTE!** 🎉
 
@@ -805,7 +860,7 @@ def handle_assignment_confirmation(chat_id, user_id, confirmation):
 🆔 **Cédula:** {details['comercial_cedula']}
 🔗 **ID Comercial:** {details['comercial_id']}
 
-**✅ Estado:** Orden asignada y activa en el sistema
+{status_line}
 
 🔄 **¿Qué hacer ahora?**
 • El comercial ya tiene la orden asignada
@@ -815,18 +870,18 @@ def handle_assignment_confirmation(chat_id, user_id, confirmation):
 
 🎯 **¡Asignación completada!**"""
                 
-                send_telegram_message(chat_id, response, parse_mode='Markdown')
+                deliver_result(chat_id, progress, response, parse_mode='Markdown')
                 
             else:
                 # Error en asignación
-                send_telegram_message(chat_id, f"❌ **Error asignando orden:**\n{result['error']}\n\n🔄 **Intenta nuevamente:** Escribe 'orden'")
+                deliver_result(chat_id, progress, f"❌ **Error asignando orden:**\n{result['error']}\n\n🔄 **Intenta nuevamente:** Escribe 'orden'")
             
             # Limpiar estado
             del user_states[user_id]
             
         except Exception as e:
             logger.error(f"Assignment confirmation error: {e}")
-            send_telegram_message(chat_id, f"❌ **Error procesando asignación:**\nNo pude completar la asignación en este momento.\n\n🔄 **Intenta nuevamente:** Escribe 'orden'")
+            deliver_result(chat_id, progress, f"❌ **Error procesando asignación:**\nNo pude completar la asignación en este momento.\n\n🔄 **Intenta nuevamente:** Escribe 'orden'")
             if user_id in user_states:
                 del user_states[user_id]
     
@@ -850,7 +905,7 @@ def handle_create_confirmation(chat_id, user_id, confirmation):
     
     if confirmation_lower in ['si', 'sí', 'yes', 'confirmar', 'confirmo', 'ok', 'vale']:
         # Confirmar creación
-        send_telegram_message(chat_id, "🏗️ **Creando comercial...**\n⏳ *Un momento por favor*")
+        progress = send_progress_message(chat_id, "🏗️ **Creando comercial...**\n⏳ *Un momento por favor*")
         
         try:
             data = state['data']
@@ -860,7 +915,8 @@ def handle_create_confirmation(chat_id, user_id, confirmation):
                 cedula=data['cedula'],
                 email=data['email'], 
                 name=data['name'],
-                phone=data['phone']
+                phone=data['phone'],
+                availability_token=data.get('cedula_lookup')
             )
             
             if result["success"]:
@@ -884,18 +940,18 @@ def handle_create_confirmation(chat_id, user_id, confirmation):
 
 🎯 **¡Listo para trabajar!**"""
                 
-                send_telegram_message(chat_id, response, parse_mode='Markdown')
+                deliver_result(chat_id, progress, response, parse_mode='Markdown')
                 
             else:
                 # Error en creación
-                send_telegram_message(chat_id, f"❌ **Error creando comercial:**\n{result['error']}\n\n🔄 **Intenta nuevamente:** Escribe 'crear'")
+                deliver_result(chat_id, progress, f"❌ **Error creando comercial:**\n{result['error']}\n\n🔄 **Intenta nuevamente:** Escribe 'crear'")
             
             # Limpiar estado
             del user_states[user_id]
             
         except Exception as e:
             logger.error(f"Create confirmation error: {e}")
-            send_telegram_message(chat_id, f"❌ **Error procesando creación:**\nNo pude crear el comercial en este momento.\n\n🔄 **Intenta nuevamente:** Escribe 'crear'")
+            deliver_result(chat_id, progress, f"❌ **Error procesando creación:**\nNo pude crear el comercial en este momento.\n\n🔄 **Intenta nuevamente:** Escribe 'crear'")
             if user_id in user_states:
                 del user_states[user_id]
     
@@ -917,8 +973,8 @@ def handle_document_number_input(chat_id, user_id, doc_number):
     state = user_states[user_id]
     doc_type = state.get('doc_type')
     
-    # Enviar mensaje de búsqueda en proceso
-    send_telegram_message(chat_id, f"Buscando {doc_type}: {doc_number}...\nUn momento por favor")
+    # Enviar mensaje de búsqueda en proceso (se edita con el resultado)
+    progress = send_progress_message(chat_id, f"Buscando {doc_type}: {doc_number}...\nUn momento por favor")
     
     try:
         # Validar documento
@@ -926,7 +982,7 @@ def handle_document_number_input(chat_id, user_id, doc_number):
         validation = validate_document_number(doc_type, doc_number)
         if not validation["valid"]:
             logger.warning(f"Validation failed: {validation['error']}")
-            send_telegram_message(chat_id, f"Formato incorrecto:\n{validation['error']}\n\nIntenta nuevamente con solo números.")
+            deliver_result(chat_id, progress, f"Formato incorrecto:\n{validation['error']}\n\nIntenta nuevamente con solo números.")
             return
         
         # Buscar cliente con nuevo flujo comercial
@@ -936,7 +992,7 @@ def handle_document_number_input(chat_id, user_id, doc_number):
         
         if not search_result["success"]:
             logger.error(f"Search failed: {search_result.get('error')}")
-            send_telegram_message(chat_id, f"Error al buscar:\nNo pude consultar los datos en este momento.\n\nPor favor intenta en unos minutos.")
+            deliver_result(chat_id, progress, f"Error al buscar:\nNo pude consultar los datos en este momento.\n\nPor favor intenta en unos minutos.")
             return
         
         if search_result["found"]:
@@ -953,7 +1009,7 @@ Recomendación: Contacta a tu supervisor o al área comercial para más informac
 
 Nueva búsqueda: Escribe 'cliente'"""
                 
-                send_telegram_message(chat_id, response)
+                deliver_result(chat_id, progress, response)
                 
             else:
                 # Cliente encontrado y disponible
@@ -986,7 +1042,7 @@ Búsqueda realizada:
 Nueva búsqueda: Escribe 'cliente'"""
                         
                         logger.info(f"Sending response: {len(response)} characters")
-                        success = send_telegram_message(chat_id, response)
+                        success = deliver_result(chat_id, progress, response)
                         logger.info(f"Message sent: {success}")
                         
                     except Exception as format_error:
@@ -998,7 +1054,7 @@ Documento: {doc_type} {doc_number}
 Estado: Cliente disponible para crear órdenes
 
 Nueva búsqueda: Escribe 'cliente'"""
-                        send_telegram_message(chat_id, simple_response)
+                        deliver_result(chat_id, progress, simple_response)
                     
                 else:
                     # Múltiples clientes encontrados
@@ -1011,7 +1067,7 @@ Resultado: Se encontraron {total_matches} clientes con este documento
 
 Nueva búsqueda: Escribe 'cliente'"""
                     
-                    send_telegram_message(chat_id, response)
+                    deliver_result(chat_id, progress, response)
             
         else:
             # Cliente no encontrado - mostrar opción de pre-registro
@@ -1039,7 +1095,7 @@ Pasos:
 
 Nueva búsqueda: Escribe 'cliente'"""
             
-            send_telegram_message(chat_id, response)
+            deliver_result(chat_id, progress, response)
         
         # Limpiar estado
         del user_states[user_id]
@@ -1047,7 +1103,7 @@ Nueva búsqueda: Escribe 'cliente'"""
         
     except Exception as e:
         logger.error(f"Document search error: {e}")
-        send_telegram_message(chat_id, f"Hubo un problema:\nNo pude completar la búsqueda en este momento.\n\nUsa 'cliente' para intentar nuevamente.")
+        deliver_result(chat_id, progress, f"Hubo un problema:\nNo pude completar la búsqueda en este momento.\n\nUsa 'cliente' para intentar nuevamente.")
         if user_id in user_states:
             del user_states[user_id]
 
@@ -1055,13 +1111,13 @@ def handle_stats_command(chat_id):
     """Manejar comando de estadísticas"""
     logger.info(f"Stats command from chat {chat_id}")
     
-    send_telegram_message(chat_id, "📊 **Cargando información...**\n⏳ *Un momento por favor*")
+    progress = send_progress_message(chat_id, "📊 **Cargando información...**\n⏳ *Un momento por favor*")
     
     try:
         summary_result = get_clients_summary()
         
         if not summary_result["success"]:
-            send_telegram_message(chat_id, f"❌ **No pude obtener la información en este momento.**\nIntenta nuevamente en unos minutos.", parse_mode='Markdown')
+            deliver_result(chat_id, progress, f"❌ **No pude obtener la información en este momento.**\nIntenta nuevamente en unos minutos.", parse_mode='Markdown')
             return
         
         stats = summary_result["stats"]
@@ -1103,11 +1159,11 @@ def handle_stats_command(chat_id):
 👤 **Para registrar comercial:** Escribe `crear`
 📦 **Para asignar orden:** Escribe `orden`"""
         
-        send_telegram_message(chat_id, response, parse_mode='Markdown')
+        deliver_result(chat_id, progress, response, parse_mode='Markdown')
         
     except Exception as e:
         logger.error(f"Stats error: {e}")
-        send_telegram_message(chat_id, f"❌ **Hubo un problema al obtener la información.**\nPor favor intenta en unos minutos.", parse_mode='Markdown')
+        deliver_result(chat_id, progress, f"❌ **Hubo un problema al obtener la información.**\nPor favor intenta en unos minutos.", parse_mode='Markdown')
 
 def handle_unknown_command(chat_id, text):
     """Manejar comandos no reconocidos"""
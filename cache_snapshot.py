@@ -0,0 +1,350 @@
+# 💾 cache_snapshot.py - Snapshots en Disco de Caches Redash v1.0
+import array
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from client_store import ClientStore, ClientRow, encode_row_values, decode_row_values
+
+logger = logging.getLogger(__name__)
+
+# Formato: [filas][offsets filas][claves][offsets claves][offsets postings][postings][header JSON][trailer]
+SNAPSHOT_MAGIC = b"MCPSNAP1"
+_TRAILER = struct.Struct("<Q8s")  # offset del header + magic
+_ALIGNMENT = 8
+
+def snapshot_path(directory, name):
+    """Ruta del snapshot de un dataset"""
+    return os.path.join(directory, f"{name}.snap")
+
+def snapshot_file_id(path):
+    """Identidad del archivo (inode, mtime) para detectar reemplazos; None si no existe"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_mtime_ns]
+
+def acquire_refresher_lock(path):
+    """Intentar tomar el lock exclusivo de refresco sin bloquear; retorna el fd o None"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # El lock se libera solo si el proceso que lo tiene termina
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+# ===== ESCRITURA =====
+
+def _pad(handle):
+    """Alinear la posición del archivo para poder leer arreglos con memoryview.cast"""
+    remainder = handle.tell() % _ALIGNMENT
+    if remainder:
+        handle.write(b"\0" * (_ALIGNMENT - remainder))
+
+def _write_array(handle, typecode, values):
+    """Escribir un arreglo numérico alineado y retornar su offset"""
+    _pad(handle)
+    offset = handle.tell()
+    array.array(typecode, values).tofile(handle)
+    return offset
+
+def write_snapshot(path, data, timestamp):
+    """Escribir el snapshot de un dataset; None si en disco ya hay uno más reciente"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lock_fd = os.open(path + ".write.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # Escrituras serializadas por dataset (hilos y procesos): un snapshot viejo nunca reemplaza a uno nuevo
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        current = read_snapshot_timestamp(path)
+        if current is not None and current > timestamp:
+            return None
+        return _write_snapshot_file(path, data, timestamp)
+    finally:
+        os.close(lock_fd)
+
+def _write_snapshot_file(path, data, timestamp):
+    """Escribir un dataset (filas + índice) a disco con reemplazo atómico"""
+    clients = data["clients"]
+    columns = data["columns"]
+    doc_columns = data["doc_columns"]
+    doc_index = data["doc_index"]
+    doc_column_positions = {col_name: position for position, col_name in enumerate(doc_columns)}
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            sections = {}
+
+            # Filas: un arreglo JSON por fila, en el orden de columnas
+            sections["rows"] = handle.tell()
+            row_offsets = [0]
+            for values in clients.iter_values():
+                handle.write(json.dumps(encode_row_values(values), ensure_ascii=False,
+                                        separators=(',', ':'), default=str).encode('utf-8'))
+                row_offsets.append(handle.tell() - sections["rows"])
+            sections["row_offsets"] = _write_array(handle, 'Q', row_offsets)
+
+            # Índice: claves ordenadas por bytes para búsqueda binaria
+            index_kind = "list"
+            entries = []
+            for key, value in doc_index.items():
+                if isinstance(value, tuple):
+                    index_kind = "first"
+                    value = [value]
+                entries.append((key.encode('utf-8'), value))
+            entries.sort(key=lambda entry: entry[0])
+
+            _pad(handle)
+            sections["keys"] = handle.tell()
+            key_offsets = [0]
+            for key_bytes, _ in entries:
+                handle.write(key_bytes)
+                key_offsets.append(handle.tell() - sections["keys"])
+            sections["key_offsets"] = _write_array(handle, 'Q', key_offsets)
+
+            postings_offsets = [0]
+            postings = array.array('I')
+            for _, matches in entries:
+                for position, col_name in matches:
+                    postings.append(position)
+                    postings.append(doc_column_positions[col_name])
+                postings_offsets.append(len(postings) // 2)
+            sections["postings_offsets"] = _write_array(handle, 'Q', postings_offsets)
+            sections["postings"] = _write_array(handle, 'I', postings)
+
+            header = {
+                "timestamp": timestamp,
+                "written_at": time.time(),
+                "row_count": len(row_offsets) - 1,
+                "key_count": len(entries),
+                "index_kind": index_kind,
+                "columns": columns,
+                "doc_columns": doc_columns,
+                "metadata": data.get("metadata", {}),
+                "sections": sections
+            }
+            header_offset = handle.tell()
+            handle.write(json.dumps(header, default=str).encode('utf-8'))
+            handle.write(_TRAILER.pack(header_offset, SNAPSHOT_MAGIC))
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# ===== LECTURA =====
+
+def read_snapshot_timestamp(path):
+    """Timestamp del snapshot en disco leyendo solo su header; None si no existe o no es válido"""
+    try:
+        with open(path, "rb") as handle:
+            handle.seek(0, os.SEEK_END)
+            size = handle.tell()
+            if size < _TRAILER.size:
+                return None
+            handle.seek(size - _TRAILER.size)
+            header_offset, magic = _TRAILER.unpack(handle.read(_TRAILER.size))
+            if magic != SNAPSHOT_MAGIC:
+                return None
+            handle.seek(header_offset)
+            return json.loads(handle.read(size - _TRAILER.size - header_offset).decode('utf-8')).get("timestamp")
+    except (OSError, ValueError):
+        return None
+
+class SnapshotFile:
+    """Snapshot abierto con mmap: filas e índice se leen directamente del archivo"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as handle:
+            stat = os.fstat(handle.fileno())
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = [stat.st_ino, stat.st_mtime_ns]
+
+        size = len(self._map)
+        if size < _TRAILER.size:
+            raise ValueError(f"Snapshot truncado: {path}")
+
+        header_offset, magic = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Formato de snapshot desconocido: {path}")
+
+        self.header = json.loads(self._map[header_offset:size - _TRAILER.size].decode('utf-8'))
+        self.size = size
+        sections = self.header["sections"]
+        row_count = self.header["row_count"]
+        key_count = self.header["key_count"]
+        view = memoryview(self._map)
+
+        self._rows_offset = sections["rows"]
+        self._row_offsets = view[sections["row_offsets"]:sections["row_offsets"] + 8 * (row_count + 1)].cast('Q')
+        self._keys_offset = sections["keys"]
+        self._key_offsets = view[sections["key_offsets"]:sections["key_offsets"] + 8 * (key_count + 1)].cast('Q')
+        self._postings_offsets = view[sections["postings_offsets"]:sections["postings_offsets"] + 8 * (key_count + 1)].cast('Q')
+        postings_count = self._postings_offsets[key_count] * 2
+        self._postings = view[sections["postings"]:sections["postings"] + 4 * postings_count].cast('I')
+
+        self.timestamp = self.header["timestamp"]
+        self.columns = self.header["columns"]
+        self.doc_columns = self.header["doc_columns"]
+        self.column_names = [col.get('name') for col in self.columns]
+        self.column_index = {col_name: position for position, col_name in enumerate(self.column_names)}
+
+    @property
+    def row_count(self):
+        return self.header["row_count"]
+
+    @property
+    def key_count(self):
+        return self.header["key_count"]
+
+    def row_values(self, position):
+        """Decodificar la tupla de valores de una fila"""
+        start = self._rows_offset + self._row_offsets[position]
+        end = self._rows_offset + self._row_offsets[position + 1]
+        return decode_row_values(json.loads(self._map[start:end].decode('utf-8')))
+
+    def key_at(self, position):
+        """Clave (bytes) en la posición dada del índice ordenado"""
+        start = self._keys_offset + self._key_offsets[position]
+        end = self._keys_offset + self._key_offsets[position + 1]
+        return self._map[start:end]
+
+    def find_key(self, key):
+        """Búsqueda binaria de la clave; retorna su posición o None"""
+        key_bytes = key.encode('utf-8')
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key_bytes:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.key_count and self.key_at(low) == key_bytes:
+            return low
+        return None
+
+    def postings(self, key_position):
+        """Coincidencias [(posición, columna)] de una clave del índice"""
+        start = self._postings_offsets[key_position]
+        end = self._postings_offsets[key_position + 1]
+        return [(self._postings[2 * i], self.doc_columns[self._postings[2 * i + 1]]) for i in range(start, end)]
+
+    def as_mapped_dataset(self):
+        """Dataset que lee filas e índice directamente del mmap"""
+        return self._dataset(MappedRows(self), MappedIndex(self), mapped=True)
+
+    def materialize(self):
+        """Dataset cargado completamente en memoria (ClientStore + dict)"""
+        clients = ClientStore(self.column_names)
+        for position in range(self.row_count):
+            clients.append_values(self.row_values(position))
+
+        doc_index = {}
+        first_only = self.header["index_kind"] == "first"
+        for key_position in range(self.key_count):
+            matches = self.postings(key_position)
+            key = self.key_at(key_position).decode('utf-8')
+            doc_index[key] = matches[0] if first_only else matches
+
+        return self._dataset(clients, doc_index, mapped=False)
+
+    def _dataset(self, clients, doc_index, mapped):
+        metadata = dict(self.header.get("metadata", {}))
+        metadata["memory"] = clients.memory_stats()
+        metadata["snapshot"] = {
+            "path": self.path,
+            "size_bytes": self.size,
+            "written_at": self.header.get("written_at"),
+            "file_id": self.file_id,
+            "mmap": mapped
+        }
+        return {
+            "clients": clients,
+            "columns": self.columns,
+            "doc_columns": self.doc_columns,
+            "doc_index": doc_index,
+            "metadata": metadata
+        }
+
+class MappedRows:
+    """Filas del snapshot con la interfaz de ClientStore, decodificadas al acceder"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self.columns = tuple(snapshot.column_names)
+
+    def __len__(self):
+        return self._snapshot.row_count
+
+    def __bool__(self):
+        return self._snapshot.row_count > 0
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("row index out of range")
+        return ClientRow(self._snapshot.column_index, self._snapshot.row_values(position))
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def iter_values(self):
+        for position in range(len(self)):
+            yield self._snapshot.row_values(position)
+
+    def memory_stats(self):
+        """Las filas viven en el archivo mapeado, no en el heap del proceso"""
+        rows = len(self)
+        return {
+            "rows": rows,
+            "mmap": True,
+            "file_bytes_per_row": round(self._snapshot.size / rows, 1) if rows else 0,
+            "file_size_mb": round(self._snapshot.size / (1024 * 1024), 2)
+        }
+
+class MappedIndex:
+    """Índice del snapshot con la interfaz de dict.get, resuelto por búsqueda binaria"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._first_only = snapshot.header["index_kind"] == "first"
+
+    def get(self, key, default=None):
+        key_position = self._snapshot.find_key(key)
+        if key_position is None:
+            return default
+        matches = self._snapshot.postings(key_position)
+        return matches[0] if self._first_only else matches
+
+    def __contains__(self, key):
+        return self._snapshot.find_key(key) is not None
+
+    def __len__(self):
+        return self._snapshot.key_count
+
+def load_snapshot(path, use_mmap=False):
+    """Cargar snapshot; retorna (data, timestamp)"""
+    snapshot = SnapshotFile(path)
+    data = snapshot.as_mapped_dataset() if use_mmap else snapshot.materialize()
+    return data, snapshot.timestamp
@@ -0,0 +1,144 @@
+# 🧱 client_store.py - Almacenamiento Columnar de Clientes v1.0
+import sys
+import logging
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+# Marca de columna ausente en la fila original (distinta de None)
+_MISSING = object()
+
+# Representación serializable de _MISSING (snapshots en disco)
+MISSING_MARKER = {"__missing__": True}
+
+# Filas usadas para estimar memoria por fila
+MEMORY_SAMPLE_ROWS = 200
+
+def encode_row_values(values):
+    """Convertir una tupla de valores a lista serializable en JSON"""
+    return [MISSING_MARKER if value is _MISSING else value for value in values]
+
+def decode_row_values(values):
+    """Reconstruir la tupla de valores desde su forma serializada"""
+    return tuple(_MISSING if isinstance(value, dict) and value.get("__missing__") is True else value
+                 for value in values)
+
+class ClientRow(Mapping):
+    """Vista de solo lectura de una fila del almacén, con acceso tipo dict"""
+    __slots__ = ("_column_index", "_values")
+
+    def __init__(self, column_index, values):
+        self._column_index = column_index
+        self._values = values
+
+    def __getitem__(self, key):
+        position = self._column_index[key]
+        if position >= len(self._values):
+            raise KeyError(key)
+        value = self._values[position]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for column, position in self._column_index.items():
+            if position < len(self._values) and self._values[position] is not _MISSING:
+                yield column
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"ClientRow({dict(self)!r})"
+
+    def to_dict(self):
+        """Copia como dict (para serializar a JSON)"""
+        return dict(self)
+
+class ClientStore:
+    """Almacén columnar: nombres de columna internados una vez y cada fila como tupla"""
+
+    def __init__(self, columns):
+        self.columns = tuple(sys.intern(str(column)) for column in columns)
+        self._column_index = {column: position for position, column in enumerate(self.columns)}
+        self._rows = []
+
+    def append(self, row):
+        """Agregar una fila dict conservando solo las columnas del almacén"""
+        if not isinstance(row, Mapping):
+            logger.warning(f"⚠️ Skipping non-dict row of type {type(row).__name__}")
+            return None
+
+        self._rows.append(tuple(row.get(column, _MISSING) for column in self.columns))
+        return len(self._rows) - 1
+
+    def replace(self, position, row):
+        """Reemplazar la fila en una posición (intercambio atómico de la tupla)"""
+        if not isinstance(row, Mapping):
+            logger.warning(f"⚠️ Skipping non-dict row of type {type(row).__name__}")
+            return False
+
+        self._rows[position] = tuple(row.get(column, _MISSING) for column in self.columns)
+        return True
+
+    def copy(self):
+        """Copia con la lista de filas propia (las tuplas se comparten, son inmutables)"""
+        store = ClientStore.__new__(ClientStore)
+        store.columns = self.columns
+        store._column_index = self._column_index
+        store._rows = list(self._rows)
+        return store
+
+    def append_values(self, values):
+        """Agregar una fila ya expresada como tupla en el orden de columnas"""
+        self._rows.append(values)
+        return len(self._rows) - 1
+
+    def iter_values(self):
+        """Recorrer las tuplas internas sin crear vistas"""
+        return iter(self._rows)
+
+    @property
+    def column_index(self):
+        return self._column_index
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [ClientRow(self._column_index, values) for values in self._rows[position]]
+        return ClientRow(self._column_index, self._rows[position])
+
+    def __iter__(self):
+        for values in self._rows:
+            yield ClientRow(self._column_index, values)
+
+    def __bool__(self):
+        return bool(self._rows)
+
+    def memory_stats(self):
+        """Estimar bytes por fila del almacén columnar frente a un dict por fila"""
+        sample = self._rows[:MEMORY_SAMPLE_ROWS]
+        if not sample:
+            return {"rows": 0, "columnar_bytes_per_row": 0, "dict_bytes_per_row": 0, "savings_pct": 0}
+
+        columnar_bytes = 0
+        dict_bytes = 0
+        for values in sample:
+            present = {column: value for column, value in zip(self.columns, values) if value is not _MISSING}
+            value_bytes = sum(sys.getsizeof(value) for value in present.values())
+            columnar_bytes += sys.getsizeof(values) + value_bytes
+            # Las claves de cada dict de Redash son cadenas propias por fila
+            dict_bytes += sys.getsizeof(present) + value_bytes + sum(sys.getsizeof(column) for column in present)
+
+        columnar_per_row = columnar_bytes / len(sample)
+        dict_per_row = dict_bytes / len(sample)
+
+        return {
+            "rows": len(self._rows),
+            "columnar_bytes_per_row": round(columnar_per_row, 1),
+            "dict_bytes_per_row": round(dict_per_row, 1),
+            "savings_pct": round((1 - columnar_per_row / dict_per_row) * 100, 1) if dict_per_row else 0,
+            "estimated_total_mb": round(columnar_per_row * len(self._rows) / (1024 * 1024), 2)
+        }
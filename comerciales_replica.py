@@ -0,0 +1,106 @@
+# 👥 comerciales_replica.py - Réplica Local de Comerciales v1.0
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def normalize_cedula(value):
+    """Normalizar cédula para el índice (misma limpieza que validate_cedula_format)"""
+    return str(value).strip().replace('-', '').replace('.', '').replace(' ', '')
+
+class ComercialesReplica:
+    """Copia en memoria de la tabla de comerciales indexada por cédula e Id"""
+
+    def __init__(self, fetch_page, page_size, max_age):
+        self._fetch_page = fetch_page
+        self.page_size = page_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._by_cedula = {}
+        self._by_id = {}
+        self._local_writes = {}  # cédula -> (momento, registro) escritos por este proceso
+        self._loaded_at = 0
+        self._stats = {"loads": 0, "load_errors": 0, "hits": 0, "misses": 0, "writes": 0}
+
+    def load(self):
+        """Descargar la tabla completa por páginas y reemplazar los índices"""
+        start_time = time.time()
+        by_cedula = {}
+        by_id = {}
+        offset = 0
+
+        while True:
+            page = self._fetch_page(offset, self.page_size)
+            if not page.get("success"):
+                with self._lock:
+                    self._stats["load_errors"] += 1
+                logger.error(f"❌ Comerciales replica load failed at offset {offset}: {page.get('error')}")
+                return False
+
+            records = page.get("records", [])
+            for record in records:
+                self._index_record(by_cedula, by_id, record)
+
+            offset += len(records)
+            if page.get("is_last_page") or len(records) < self.page_size:
+                break
+
+        with self._lock:
+            # Escrituras locales hechas durante la descarga que NocoDB aún no reflejaba
+            for cedula, (written_at, record) in list(self._local_writes.items()):
+                if written_at < start_time:
+                    del self._local_writes[cedula]
+                elif cedula not in by_cedula:
+                    self._index_record(by_cedula, by_id, record)
+            self._by_cedula = by_cedula
+            self._by_id = by_id
+            self._loaded_at = time.time()
+            self._stats["loads"] += 1
+
+        logger.info(f"👥 Comerciales replica loaded: {len(by_cedula)} records in {time.time() - start_time:.2f}s")
+        return True
+
+    def _index_record(self, by_cedula, by_id, record):
+        if record.get("cedula"):
+            by_cedula[normalize_cedula(record["cedula"])] = record
+        record_id = record.get("Id") or record.get("id")
+        if record_id is not None:
+            by_id[record_id] = record
+
+    def is_fresh(self):
+        """La réplica responde solo si está cargada y reconciliada recientemente"""
+        return self._loaded_at > 0 and time.time() - self._loaded_at < self.max_age
+
+    def get_by_cedula(self, cedula):
+        """Comercial por cédula; None si no está o la réplica no está vigente"""
+        if not self.is_fresh():
+            return None
+
+        record = self._by_cedula.get(normalize_cedula(cedula))
+        with self._lock:
+            self._stats["hits" if record is not None else "misses"] += 1
+        return record
+
+    def get_by_id(self, comercial_id):
+        """Comercial por Id; None si no está o la réplica no está vigente"""
+        if not self.is_fresh():
+            return None
+        return self._by_id.get(comercial_id)
+
+    def upsert(self, record):
+        """Escritura directa tras crear/consultar un comercial en NocoDB"""
+        with self._lock:
+            self._index_record(self._by_cedula, self._by_id, record)
+            if record.get("cedula"):
+                self._local_writes[normalize_cedula(record["cedula"])] = (time.time(), record)
+            self._stats["writes"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                records=len(self._by_cedula),
+                fresh=self.is_fresh(),
+                age_seconds=round(time.time() - self._loaded_at, 1) if self._loaded_at else None
+            )
@@ -26,6 +26,10 @@ NOCODB_TABLE_ID = os.getenv('NOCODB_TABLE_ID')  # Tabla de comerciales
 # ===== CONFIGURACIÓN NOCODB ÓRDENES (NUEVA) =====
 NOCODB_ORDERS_TABLE_ID = os.getenv('NOCODB_ORDERS_TABLE_ID', 'mf0d57ub8rdzs05')  # Tabla de órdenes
 NOCODB_ASSIGNMENTS_TABLE_ID = os.getenv('NOCODB_ASSIGNMENTS_TABLE_ID', 'mouf2kg34a7kwv4')  # Tabla de asignaciones
+NOCODB_LOOKUP_WORKERS = int(os.getenv('NOCODB_LOOKUP_WORKERS', '8'))  # hilos para consultas en paralelo
+NOCODB_BULK_CHUNK_SIZE = int(os.getenv('NOCODB_BULK_CHUNK_SIZE', '100'))  # registros por request en operaciones masivas
+BULK_ASSIGN_MAX_ITEMS = int(os.getenv('BULK_ASSIGN_MAX_ITEMS', '500'))  # pares por solicitud de asignación masiva
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '2000'))  # filas por importación de comerciales
 
 # ===== URL DE PRE-REGISTRO =====
 PREREGISTER_URL = os.getenv('PREREGISTER_URL')
@@ -82,12 +86,104 @@ unavailable_clients_cache = {
     "ttl": 1800  # 30 minutos para datos más dinámicos
 }
 
+# ===== CONFIGURACIÓN REFRESCO DE CACHE =====
+CACHE_SCHEDULER_ENABLED = os.getenv('CACHE_SCHEDULER_ENABLED', 'true').lower() == 'true'
+CACHE_REFRESH_MARGIN = int(os.getenv('CACHE_REFRESH_MARGIN', '120'))  # segundos antes de expirar
+CACHE_REFRESH_RETRY = int(os.getenv('CACHE_REFRESH_RETRY', '60'))  # segundos entre reintentos
+
+# ===== CONFIGURACIÓN INGESTA REDASH =====
+REDASH_STREAMING = os.getenv('REDASH_STREAMING', 'true').lower() == 'true'  # Leer filas en streaming
+REDASH_STREAM_CHUNK_SIZE = int(os.getenv('REDASH_STREAM_CHUNK_SIZE', '65536'))  # bytes
+REDASH_PROJECT_COLUMNS = os.getenv('REDASH_PROJECT_COLUMNS', 'true').lower() == 'true'  # Solo columnas usadas
+REDASH_KEEP_COLUMNS = [col.strip() for col in os.getenv('REDASH_KEEP_COLUMNS', '').split(',') if col.strip()]
+
+# ===== CONFIGURACIÓN SNAPSHOTS DE CACHE =====
+CACHE_SNAPSHOT_DIR = os.getenv('CACHE_SNAPSHOT_DIR', '/tmp/mcpcomercialext-cache')  # vacío = deshabilitado
+CACHE_SNAPSHOT_MMAP = os.getenv('CACHE_SNAPSHOT_MMAP', 'false').lower() == 'true'  # Leer filas desde el archivo mapeado
+CACHE_SNAPSHOT_MAX_AGE = int(os.getenv('CACHE_SNAPSHOT_MAX_AGE', '86400'))  # segundos; snapshots más viejos se ignoran
+
+# ===== CONFIGURACIÓN CACHE COMPARTIDO ENTRE WORKERS =====
+SHARED_CACHE = os.getenv('SHARED_CACHE', 'false').lower() == 'true'  # Un worker refresca, todos mapean el snapshot
+SHARED_CACHE_CHECK_INTERVAL = int(os.getenv('SHARED_CACHE_CHECK_INTERVAL', '5'))  # segundos entre revisiones del archivo
+
+# ===== CONFIGURACIÓN REFRESCO INCREMENTAL DE CLIENTES =====
+REDASH_DELTA_QUERY_ID = os.getenv('REDASH_DELTA_QUERY_ID', '')  # Query parametrizada de cambios; vacío = deshabilitado
+REDASH_DELTA_API_KEY = os.getenv('REDASH_DELTA_API_KEY') or REDASH_API_KEY  # vacío = API key de clientes
+REDASH_DELTA_COLUMN = os.getenv('REDASH_DELTA_COLUMN', 'updated_at')  # Columna monotónica (fecha o id)
+REDASH_DELTA_PARAMETER = os.getenv('REDASH_DELTA_PARAMETER', 'since')  # Parámetro de la query que recibe la marca
+REDASH_DELTA_KEY_COLUMN = os.getenv('REDASH_DELTA_KEY_COLUMN', '')  # Identidad de la fila; vacío = primera columna de documento
+REDASH_FULL_REFRESH_INTERVAL = int(os.getenv('REDASH_FULL_REFRESH_INTERVAL', '86400'))  # segundos entre descargas completas
+REDASH_JOB_POLL_INTERVAL = float(os.getenv('REDASH_JOB_POLL_INTERVAL', '1'))  # segundos entre consultas del job
+
+# ===== CONFIGURACIÓN BÚSQUEDA PUNTUAL CON CACHE FRÍO =====
+REDASH_LOOKUP_QUERY_ID = os.getenv('REDASH_LOOKUP_QUERY_ID', '')  # Query filtrada por documento; vacío = deshabilitado
+REDASH_LOOKUP_API_KEY = os.getenv('REDASH_LOOKUP_API_KEY') or REDASH_API_KEY  # vacío = API key de clientes
+REDASH_LOOKUP_PARAMETER = os.getenv('REDASH_LOOKUP_PARAMETER', 'document')  # Parámetro que recibe el documento
+REDASH_LOOKUP_TIMEOUT = int(os.getenv('REDASH_LOOKUP_TIMEOUT', '10'))  # segundos
+
+# ===== CONFIGURACIÓN RÉPLICA DE COMERCIALES =====
+COMERCIALES_REPLICA_ENABLED = os.getenv('COMERCIALES_REPLICA_ENABLED', 'true').lower() == 'true'
+COMERCIALES_REPLICA_PAGE_SIZE = int(os.getenv('COMERCIALES_REPLICA_PAGE_SIZE', '1000'))  # registros por página
+COMERCIALES_REPLICA_SYNC_INTERVAL = int(os.getenv('COMERCIALES_REPLICA_SYNC_INTERVAL', '300'))  # segundos entre reconciliaciones
+COMERCIALES_REPLICA_MAX_AGE = int(os.getenv('COMERCIALES_REPLICA_MAX_AGE', '900'))  # segundos; más vieja se consulta NocoDB
+COMERCIALES_REPLICA_RETRY = int(os.getenv('COMERCIALES_REPLICA_RETRY', '60'))  # segundos entre reintentos si la carga falla
+
+# ===== CONFIGURACIÓN ESCRITURA DIFERIDA DE ASIGNACIONES =====
+ASSIGNMENT_WRITE_BEHIND = os.getenv('ASSIGNMENT_WRITE_BEHIND', 'false').lower() == 'true'
+ASSIGNMENT_JOURNAL_PATH = os.getenv('ASSIGNMENT_JOURNAL_PATH', '/tmp/mcpcomercialext-assignments.jsonl')
+ASSIGNMENT_BATCH_SIZE = int(os.getenv('ASSIGNMENT_BATCH_SIZE', '50'))  # asignaciones por POST a NocoDB
+ASSIGNMENT_BATCH_LINGER = float(os.getenv('ASSIGNMENT_BATCH_LINGER', '1'))  # segundos para acumular un lote
+ASSIGNMENT_MAX_ATTEMPTS = int(os.getenv('ASSIGNMENT_MAX_ATTEMPTS', '5'))  # intentos antes de avisar la falla
+ASSIGNMENT_RETRY_INTERVAL = int(os.getenv('ASSIGNMENT_RETRY_INTERVAL', '5'))  # segundos base del backoff
+
+# ===== CONFIGURACIÓN LOOKUPS VERIFICADOS =====
+VERIFIED_LOOKUP_TTL = int(os.getenv('VERIFIED_LOOKUP_TTL', '180'))  # segundos que una verificación del flujo sigue válida
+
+# ===== CONFIGURACIÓN PROCESAMIENTO DEL WEBHOOK =====
+WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'true').lower() == 'true'  # responder 200 y procesar en segundo plano
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '8'))  # hilos del pool; cada usuario se procesa en orden, uno a la vez (no más que HTTP_POOL_SIZE)
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))  # updates en espera antes de responder 503
+WEBHOOK_DEDUP_WINDOW = int(os.getenv('WEBHOOK_DEDUP_WINDOW', '3600'))  # segundos que se recuerda un update_id
+WEBHOOK_DEDUP_MAX_IDS = int(os.getenv('WEBHOOK_DEDUP_MAX_IDS', '20000'))  # update_id recordados como máximo
+
+# ===== CONFIGURACIÓN ENVÍO DE MENSAJES TELEGRAM =====
+TELEGRAM_DISPATCHER_ENABLED = os.getenv('TELEGRAM_DISPATCHER_ENABLED', 'true').lower() == 'true'
+TELEGRAM_SENDER_WORKERS = int(os.getenv('TELEGRAM_SENDER_WORKERS', '4'))  # hilos de envío (cada chat siempre en el mismo)
+TELEGRAM_OUTBOX_SIZE = int(os.getenv('TELEGRAM_OUTBOX_SIZE', '5000'))  # mensajes en cola antes de descartar
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))  # mensajes por segundo del bot entre todos los workers
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))  # mensajes por segundo por chat
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', '3'))  # ráfaga por chat
+TELEGRAM_MAX_QUEUE_WAIT = float(os.getenv('TELEGRAM_MAX_QUEUE_WAIT', '30'))  # segundos máximos esperando el límite global
+TELEGRAM_429_RETRIES = int(os.getenv('TELEGRAM_429_RETRIES', '3'))  # reintentos tras HTTP 429 o error de envío
+TELEGRAM_RETRY_DELAY = float(os.getenv('TELEGRAM_RETRY_DELAY', '1'))  # segundos base del backoff tras error de envío
+TELEGRAM_EDIT_WAIT = float(os.getenv('TELEGRAM_EDIT_WAIT', '10'))  # segundos máximos esperando editar el mensaje de progreso
+
 # ===== CONFIGURACIÓN TIMEOUTS =====
 REDASH_TIMEOUT = int(os.getenv('REDASH_TIMEOUT', '30'))  # segundos
 TELEGRAM_TIMEOUT = int(os.getenv('TELEGRAM_TIMEOUT', '8'))  # segundos
 WEBHOOK_TIMEOUT = int(os.getenv('WEBHOOK_TIMEOUT', '8'))  # segundos
 NOCODB_TIMEOUT = int(os.getenv('NOCODB_TIMEOUT', '15'))  # segundos
 
+# ===== CONFIGURACIÓN CONEXIONES HTTP =====
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))  # conexiones por servicio; igual o mayor a los hilos por worker
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))  # reintentos de conexión fallida
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.3'))  # segundos base entre reintentos
+
+# ===== CONFIGURACIÓN RESILIENCIA =====
+UPSTREAM_READ_RETRIES = int(os.getenv('UPSTREAM_READ_RETRIES', '2'))  # reintentos de lecturas (GET) fallidas
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.2'))  # segundos; backoff exponencial con jitter
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '2'))  # segundos máximos entre reintentos
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))  # fallas seguidas para abrir el circuito
+CIRCUIT_RESET_TIMEOUT = int(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))  # segundos abierto antes de probar de nuevo
+
+# ===== CONFIGURACIÓN LÍMITE DE TASA NOCODB =====
+# Límites totales del despliegue: cada worker de gunicorn (WEB_CONCURRENCY) aplica su parte
+WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))  # workers de gunicorn que comparten la cuota
+NOCODB_RATE_LIMIT = float(os.getenv('NOCODB_RATE_LIMIT', '5'))  # solicitudes por segundo entre todos los workers; 0 = sin límite
+NOCODB_RATE_BURST = int(os.getenv('NOCODB_RATE_BURST', '10'))  # ráfaga máxima entre todos los workers
+NOCODB_RATE_MAX_WAIT = float(os.getenv('NOCODB_RATE_MAX_WAIT', '5'))  # segundos máximos en cola antes de fallar
+NOCODB_429_RETRIES = int(os.getenv('NOCODB_429_RETRIES', '2'))  # reintentos tras HTTP 429 (respetando Retry-After)
+
 # ===== CONFIGURACIÓN BOT =====
 MAX_RESULTS_SHOW = int(os.getenv('MAX_RESULTS_SHOW', '5'))
 MAX_MESSAGE_LENGTH = int(os.getenv('MAX_MESSAGE_LENGTH', '4000'))
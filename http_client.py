@@ -0,0 +1,57 @@
+# 🔌 http_client.py - Sesiones HTTP Persistentes por Servicio v1.0
+import requests
+import logging
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import *
+from resilience import get_circuit_breaker, get_rate_limiter, call_upstream
+
+logger = logging.getLogger(__name__)
+
+# Una sesión (pool de conexiones keep-alive) por servicio externo: redash, nocodb, telegram
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class ResilientSession(requests.Session):
+    """Sesión que pasa cada request por el limitador, el circuit breaker y los reintentos del servicio"""
+
+    def __init__(self, upstream):
+        super().__init__()
+        self.upstream = upstream
+        self.breaker = get_circuit_breaker(upstream)
+        self.limiter = get_rate_limiter(upstream)
+
+    def request(self, method, url, *args, **kwargs):
+        send = lambda: super(ResilientSession, self).request(method, url, *args, **kwargs)
+        return call_upstream(self.breaker, method, send, limiter=self.limiter)
+
+def build_http_session(upstream):
+    """Crear sesión con pool de conexiones y reintentos solo de conexión"""
+    # Solo se reintenta si la petición no llegó a enviarse: seguro también para POST
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=0,
+        status=0,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        allowed_methods=None
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+
+    session = ResilientSession(upstream)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    logger.info(f"🔌 HTTP session created for {upstream} (pool size {HTTP_POOL_SIZE})")
+    return session
+
+def get_http_session(upstream):
+    """Sesión compartida por todos los hilos para un servicio externo"""
+    session = _sessions.get(upstream)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if upstream not in _sessions:
+            _sessions[upstream] = build_http_session(upstream)
+        return _sessions[upstream]
@@ -3,11 +3,28 @@ import requests
 import logging
 import re
 import json
+import csv
+import io
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from config import *
+from utils import get_single_flight, create_verified_lookup, get_verified_lookup, send_telegram_message
+from http_client import get_http_session
+from resilience import RateLimitExceeded
+from comerciales_replica import ComercialesReplica
+from assignment_journal import AssignmentJournal
+from cache_snapshot import acquire_refresher_lock
 
 logger = logging.getLogger(__name__)
 
+# Columnas necesarias para asignar órdenes (Id para la relación, nombre y cédula para la respuesta)
+COMERCIAL_LOOKUP_FIELDS = "Id,cedula,name"
+
+# Ejecutor acotado para consultas independientes a NocoDB dentro de un mismo flujo
+_lookup_executor = ThreadPoolExecutor(max_workers=NOCODB_LOOKUP_WORKERS, thread_name_prefix="nocodb-lookup")
+
 def validate_email_format(email):
     """Validar formato de email con regex mejorado"""
     try:
@@ -151,17 +168,45 @@ def validate_order_number_format(order_number):
     except Exception as e:
         return {"valid": False, "error": f"Error validando número de orden: {str(e)}"}
 
-def check_comercial_exists(cedula):
-    """Verificar si el comercial ya existe en NocoDB"""
+def check_comercial_exists(cedula, fields=None):
+    """Verificar si el comercial ya existe en NocoDB (fields limita las columnas leídas)"""
+    # Validar cédula primero
+    validation = validate_cedula_format(cedula)
+    if not validation["valid"]:
+        return {"success": False, "error": validation["error"]}
+    
+    clean_cedula = validation["cleaned_cedula"]
+    
+    # Réplica local vigente: responder sin ir a NocoDB
+    if COMERCIALES_REPLICA_ENABLED:
+        replica_record = comerciales_replica.get_by_cedula(clean_cedula)
+        if replica_record is not None:
+            logger.info(f"👥 Comercial found in local replica: {clean_cedula}")
+            return {
+                "success": True,
+                "exists": True,
+                "comercial_data": replica_record,
+                "message": f"El comercial con cédula {clean_cedula} ya está registrado en el sistema",
+                "source": "replica"
+            }
+    
+    # Coalescer consultas concurrentes por la misma cédula (y la misma proyección)
+    result = get_single_flight("nocodb:comerciales").do((clean_cedula, fields), _fetch_comercial_by_cedula, clean_cedula, fields)
+    
+    # Un comercial que la réplica no tenía (creado en otro proceso) se agrega de inmediato
+    if COMERCIALES_REPLICA_ENABLED and fields is None and result.get("exists") and result.get("comercial_data"):
+        comerciales_replica.upsert(result["comercial_data"])
+    
+    # La disponibilidad verificada se puede reutilizar al crear (copia: el resultado es compartido)
+    if result.get("success") and not result.get("exists"):
+        result = dict(result, verified_lookup=create_verified_lookup("cedula_available", clean_cedula, {}))
+    
+    return result
+
+def _fetch_comercial_by_cedula(clean_cedula, fields=None):
+    """Consultar en NocoDB el comercial con la cédula ya validada"""
     try:
-        logger.info(f"🔍 Checking if comercial exists: {cedula}")
-        
-        # Validar cédula primero
-        validation = validate_cedula_format(cedula)
-        if not validation["valid"]:
-            return {"success": False, "error": validation["error"]}
-        
-        clean_cedula = validation["cleaned_cedula"]
+        logger.info(f"🔍 Checking if comercial exists: {clean_cedula}")
         
         # Construir URL para consulta - EXACTAMENTE como tu CURL
         url = f"{NOCODB_BASE_URL}/tables/{NOCODB_TABLE_ID}/records"
@@ -171,6 +216,8 @@ def check_comercial_exists(cedula):
             "shuffle": 0,
             "offset": 0
         }
+        if fields:
+            params["fields"] = fields
         
         headers = {
             "accept": "application/json",
@@ -192,7 +239,7 @@ curl -X 'GET' '{full_url}' \\
 """
         logger.info(curl_command)
         
-        response = requests.get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+        response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
         
         logger.info(f"📡 NocoDB Response Status: {response.status_code}")
         logger.info(f"📡 NocoDB Response Headers: {dict(response.headers)}")
@@ -236,6 +283,10 @@ curl -X 'GET' '{full_url}' \\
             logger.error(f"❌ Response text: {response.text}")
             return {"success": False, "error": f"Respuesta inválida del servidor: {je}"}
         
+    except RateLimitExceeded as e:
+        logger.warning(f"⏳ NocoDB rate limit reached: {e}")
+        return {"success": False, "error": "NocoDB está recibiendo demasiadas solicitudes. Intenta en unos segundos."}
+    
     except requests.exceptions.Timeout:
         logger.error(f"❌ Timeout checking comercial existence")
         return {"success": False, "error": "Timeout al verificar comercial. Intenta nuevamente."}
@@ -248,45 +299,125 @@ curl -X 'GET' '{full_url}' \\
         logger.error(f"❌ Unexpected error checking comercial existence: {e}")
         return {"success": False, "error": f"Error verificando comercial: {str(e)}"}
 
-def create_comercial(cedula, email, name, phone):
-    """Crear nuevo comercial en NocoDB"""
+# ===== RÉPLICA LOCAL DE COMERCIALES =====
+
+def _fetch_comerciales_page(offset, limit):
+    """Leer una página de la tabla de comerciales (ordenada por Id para paginar estable)"""
     try:
-        logger.info(f"🏗️ Creating comercial: {cedula}")
+        url = f"{NOCODB_BASE_URL}/tables/{NOCODB_TABLE_ID}/records"
+        params = {
+            "limit": limit,
+            "offset": offset,
+            "sort": "Id",
+            "shuffle": 0
+        }
         
-        # Validar todos los campos
-        validations = {
-            "cedula": validate_cedula_format(cedula),
-            "email": validate_email_format(email),
-            "name": validate_name_format(name),
-            "phone": validate_phone_format(phone)
+        headers = {
+            "accept": "application/json",
+            "xc-token": NOCODB_TOKEN
+        }
+        
+        response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+        
+        if response.status_code != 200:
+            return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+        
+        data = response.json()
+        return {
+            "success": True,
+            "records": data.get("list", []),
+            "is_last_page": data.get("pageInfo", {}).get("isLastPage", False)
         }
         
-        # Verificar si hay errores de validación
-        validation_errors = []
-        for field, validation in validations.items():
-            if not validation["valid"]:
-                validation_errors.append(f"{field.capitalize()}: {validation['error']}")
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+comerciales_replica = ComercialesReplica(_fetch_comerciales_page, COMERCIALES_REPLICA_PAGE_SIZE, COMERCIALES_REPLICA_MAX_AGE)
+_replica_thread = None
+
+def start_comerciales_replica():
+    """Iniciar hilo que carga y reconcilia periódicamente la réplica de comerciales"""
+    global _replica_thread
+    
+    if not COMERCIALES_REPLICA_ENABLED:
+        logger.info("ℹ️ Comerciales replica disabled")
+        return False
+    
+    if _replica_thread is not None and _replica_thread.is_alive():
+        return False
+    
+    _replica_thread = threading.Thread(target=_comerciales_replica_loop, name="comerciales-replica-sync", daemon=True)
+    _replica_thread.start()
+    logger.info(f"👥 Comerciales replica sync started (every {COMERCIALES_REPLICA_SYNC_INTERVAL}s)")
+    return True
+
+def _comerciales_replica_loop():
+    """Bucle de sincronización: recarga completa y reintento rápido si falla"""
+    while True:
+        try:
+            loaded = comerciales_replica.load()
+        except Exception as e:
+            logger.error(f"❌ Comerciales replica sync error: {e}")
+            loaded = False
+        
+        time.sleep(COMERCIALES_REPLICA_SYNC_INTERVAL if loaded else COMERCIALES_REPLICA_RETRY)
+
+def get_comerciales_replica_stats():
+    """Estado de la réplica de comerciales para /health"""
+    if not COMERCIALES_REPLICA_ENABLED:
+        return {"enabled": False}
+    return dict(comerciales_replica.get_stats(), enabled=True)
+
+def validate_comercial_fields(cedula, email, name, phone):
+    """Validar los campos de un comercial; retorna (datos limpios, errores)"""
+    validations = {
+        "cedula": validate_cedula_format(cedula),
+        "email": validate_email_format(email),
+        "name": validate_name_format(name),
+        "phone": validate_phone_format(phone)
+    }
+    
+    validation_errors = []
+    for field, validation in validations.items():
+        if not validation["valid"]:
+            validation_errors.append(f"{field.capitalize()}: {validation['error']}")
+    
+    if validation_errors:
+        return None, validation_errors
+    
+    # Extraer valores limpios
+    clean_data = {
+        "cedula": validations["cedula"]["cleaned_cedula"],
+        "email": validations["email"]["cleaned_email"],
+        "name": validations["name"]["cleaned_name"],
+        "phone": validations["phone"]["cleaned_phone"]
+    }
+    
+    return clean_data, []
+
+def create_comercial(cedula, email, name, phone, availability_token=None):
+    """Crear nuevo comercial en NocoDB (availability_token evita re-verificar la cédula)"""
+    try:
+        logger.info(f"🏗️ Creating comercial: {cedula}")
+        
+        # Validar todos los campos
+        clean_data, validation_errors = validate_comercial_fields(cedula, email, name, phone)
         
         if validation_errors:
             error_message = "\n".join(validation_errors)
             logger.warning(f"⚠️ Validation errors: {error_message}")
             return {"success": False, "error": f"Errores de validación:\n{error_message}"}
         
-        # Extraer valores limpios
-        clean_data = {
-            "cedula": validations["cedula"]["cleaned_cedula"],
-            "email": validations["email"]["cleaned_email"],
-            "name": validations["name"]["cleaned_name"],
-            "phone": validations["phone"]["cleaned_phone"]
-        }
-        
-        # Verificar que el comercial no exista antes de crear
-        exists_check = check_comercial_exists(clean_data["cedula"])
-        if not exists_check["success"]:
-            return {"success": False, "error": f"Error verificando existencia: {exists_check['error']}"}
-        
-        if exists_check["exists"]:
-            return {"success": False, "error": exists_check["message"]}
+        # Verificar que el comercial no exista antes de crear (salvo verificación reciente del mismo flujo)
+        if get_verified_lookup(availability_token, "cedula_available", clean_data["cedula"]) is not None:
+            logger.info(f"♻️ Reusing verified availability for cedula {clean_data['cedula']}")
+        else:
+            exists_check = check_comercial_exists(clean_data["cedula"])
+            if not exists_check["success"]:
+                return {"success": False, "error": f"Error verificando existencia: {exists_check['error']}"}
+            
+            if exists_check["exists"]:
+                return {"success": False, "error": exists_check["message"]}
         
         # Construir request para creación - EXACTAMENTE como tu CURL
         url = f"{NOCODB_BASE_URL}/tables/{NOCODB_TABLE_ID}/records"
@@ -314,7 +445,7 @@ curl -X 'POST' '{url}' \\
 """
         logger.info(curl_command)
         
-        response = requests.post(url, json=payload, headers=headers, timeout=NOCODB_TIMEOUT)
+        response = get_http_session("nocodb").post(url, json=payload, headers=headers, timeout=NOCODB_TIMEOUT)
         
         logger.info(f"📡 NocoDB Response Status: {response.status_code}")
         logger.info(f"📡 NocoDB Response Headers: {dict(response.headers)}")
@@ -325,6 +456,10 @@ curl -X 'POST' '{url}' \\
                 created_comercial = response.json()
                 logger.info(f"✅ Comercial created successfully: {clean_data['cedula']}")
                 
+                # Escritura directa en la réplica (NocoDB retorna solo el Id creado)
+                if COMERCIALES_REPLICA_ENABLED and isinstance(created_comercial, dict):
+                    comerciales_replica.upsert(dict(clean_data, **created_comercial))
+                
                 return {
                     "success": True,
                     "comercial_data": created_comercial,
@@ -368,6 +503,10 @@ curl -X 'POST' '{url}' \\
                 }
             }
         
+    except RateLimitExceeded as e:
+        logger.warning(f"⏳ NocoDB rate limit reached: {e}")
+        return {"success": False, "error": "NocoDB está recibiendo demasiadas solicitudes. Intenta en unos segundos."}
+    
     except requests.exceptions.Timeout:
         logger.error(f"❌ Timeout error creating comercial")
         return {"success": False, "error": "Timeout al crear comercial. Intenta nuevamente."}
@@ -404,13 +543,13 @@ def get_comercial_info(cedula):
         logger.error(f"❌ Error getting comercial info: {e}")
         return {"success": False, "error": f"Error obteniendo información: {str(e)}"}
 
-def get_comercial_by_cedula(cedula):
+def get_comercial_by_cedula(cedula, fields=None):
     """Obtener comercial por cédula y retornar ID si existe"""
     try:
         logger.info(f"🔍 Getting comercial by cedula: {cedula}")
         
         # Reutilizar la función existente pero extraer el ID
-        exists_check = check_comercial_exists(cedula)
+        exists_check = check_comercial_exists(cedula, fields=fields)
         
         if not exists_check.get("success"):
             return {"success": False, "error": exists_check.get("error")}
@@ -434,29 +573,94 @@ def get_comercial_by_cedula(cedula):
         
         logger.info(f"✅ Comercial found with ID: {comercial_id}")
         
+        clean_cedula = validate_cedula_format(cedula)["cleaned_cedula"]
+        
         return {
             "success": True,
             "found": True,
             "comercial_id": comercial_id,
             "comercial_data": comercial_data,
-            "message": f"Comercial encontrado: {comercial_data.get('name', 'Sin nombre')}"
+            "message": f"Comercial encontrado: {comercial_data.get('name', 'Sin nombre')}",
+            "verified_lookup": create_verified_lookup(
+                "comercial", clean_cedula, {"comercial_id": comercial_id, "comercial_data": comercial_data}
+            )
         }
         
     except Exception as e:
         logger.error(f"❌ Error getting comercial by cedula: {e}")
         return {"success": False, "error": f"Error obteniendo comercial: {str(e)}"}
 
-def check_order_exists(order_number):
-    """Verificar si la orden existe en NocoDB"""
+def check_order_exists(order_number, count_only=False):
+    """Verificar si la orden existe en NocoDB (count_only usa /records/count sin traer la orden)"""
+    # Validar y normalizar número de orden
+    validation = validate_order_number_format(order_number)
+    if not validation["valid"]:
+        return {"success": False, "error": validation["error"]}
+    
+    normalized_order = validation["normalized_order"]
+    
+    if count_only:
+        return get_single_flight("nocodb:orders:count").do(normalized_order, _count_orders_by_number, normalized_order)
+    
+    # Coalescer consultas concurrentes por la misma orden
+    return get_single_flight("nocodb:orders").do(normalized_order, _fetch_order_by_number, normalized_order)
+
+def _count_orders_by_number(normalized_order):
+    """Contar en NocoDB las órdenes con el número ya normalizado (sin leer registros)"""
     try:
-        logger.info(f"📦 Checking if order exists: {order_number}")
+        logger.info(f"📦 Counting orders: {normalized_order}")
         
-        # Validar y normalizar número de orden
-        validation = validate_order_number_format(order_number)
-        if not validation["valid"]:
-            return {"success": False, "error": validation["error"]}
+        url = f"{NOCODB_BASE_URL}/tables/{NOCODB_ORDERS_TABLE_ID}/records/count"
+        params = {"where": f"(order_number,eq,{normalized_order})"}
+        headers = {
+            "accept": "application/json",
+            "xc-token": NOCODB_TOKEN
+        }
         
-        normalized_order = validation["normalized_order"]
+        response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+        
+        if response.status_code != 200:
+            logger.error(f"❌ NocoDB HTTP Error: {response.status_code} - {response.text}")
+            return {"success": False, "error": f"Error consultando órdenes: HTTP {response.status_code}"}
+        
+        count = response.json().get("count", 0)
+        logger.info(f"📊 Count result: {count}")
+        
+        if count > 0:
+            return {
+                "success": True,
+                "exists": True,
+                "normalized_order": normalized_order,
+                "message": f"La orden {normalized_order} existe en el sistema"
+            }
+        
+        return {
+            "success": True,
+            "exists": False,
+            "normalized_order": normalized_order,
+            "message": f"La orden {normalized_order} no existe en el sistema"
+        }
+        
+    except RateLimitExceeded as e:
+        logger.warning(f"⏳ NocoDB rate limit reached: {e}")
+        return {"success": False, "error": "NocoDB está recibiendo demasiadas solicitudes. Intenta en unos segundos."}
+    
+    except requests.exceptions.Timeout:
+        logger.error(f"❌ Timeout counting orders")
+        return {"success": False, "error": "Timeout al verificar orden. Intenta nuevamente."}
+    
+    except requests.exceptions.ConnectionError:
+        logger.error(f"❌ Connection error counting orders")
+        return {"success": False, "error": "Error de conexión con NocoDB. Verifica la conectividad."}
+        
+    except Exception as e:
+        logger.error(f"❌ Unexpected error counting orders: {e}")
+        return {"success": False, "error": f"Error verificando orden: {str(e)}"}
+
+def _fetch_order_by_number(normalized_order):
+    """Consultar en NocoDB la orden con el número ya normalizado"""
+    try:
+        logger.info(f"📦 Checking if order exists: {normalized_order}")
         
         # Construir URL para consulta de órdenes
         url = f"{NOCODB_BASE_URL}/tables/{NOCODB_ORDERS_TABLE_ID}/records"
@@ -486,7 +690,7 @@ curl -X 'GET' '{full_url}' \\
 """
         logger.info(curl_command)
         
-        response = requests.get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+        response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
         
         logger.info(f"📡 NocoDB Response Status: {response.status_code}")
         logger.info(f"📡 NocoDB Response Body: {response.text}")
@@ -515,7 +719,8 @@ curl -X 'GET' '{full_url}' \\
                     "exists": True,
                     "order_data": existing_order,
                     "normalized_order": normalized_order,
-                    "message": f"La orden {normalized_order} existe en el sistema"
+                    "message": f"La orden {normalized_order} existe en el sistema",
+                    "verified_lookup": create_verified_lookup("order", normalized_order, {"order_data": existing_order})
                 }
             else:
                 logger.info(f"❌ Order does not exist: {normalized_order}")
@@ -530,6 +735,10 @@ curl -X 'GET' '{full_url}' \\
             logger.error(f"❌ Invalid JSON response: {je}")
             return {"success": False, "error": f"Respuesta inválida del servidor: {je}"}
         
+    except RateLimitExceeded as e:
+        logger.warning(f"⏳ NocoDB rate limit reached: {e}")
+        return {"success": False, "error": "NocoDB está recibiendo demasiadas solicitudes. Intenta en unos segundos."}
+    
     except requests.exceptions.Timeout:
         logger.error(f"❌ Timeout checking order existence")
         return {"success": False, "error": "Timeout al verificar orden. Intenta nuevamente."}
@@ -583,7 +792,7 @@ curl -X 'POST' '{url}' \\
 """
         logger.info(curl_command)
         
-        response = requests.post(url, json=payload, headers=headers, timeout=NOCODB_TIMEOUT)
+        response = get_http_session("nocodb").post(url, json=payload, headers=headers, timeout=NOCODB_TIMEOUT)
         
         logger.info(f"📡 NocoDB Response Status: {response.status_code}")
         logger.info(f"📡 NocoDB Response Headers: {dict(response.headers)}")
@@ -638,6 +847,10 @@ curl -X 'POST' '{url}' \\
                 }
             }
         
+    except RateLimitExceeded as e:
+        logger.warning(f"⏳ NocoDB rate limit reached: {e}")
+        return {"success": False, "error": "NocoDB está recibiendo demasiadas solicitudes. Intenta en unos segundos."}
+    
     except requests.exceptions.Timeout:
         logger.error(f"❌ Timeout error assigning order")
         return {"success": False, "error": "Timeout al asignar orden. Intenta nuevamente."}
@@ -650,34 +863,90 @@ curl -X 'POST' '{url}' \\
         logger.error(f"❌ Unexpected error assigning order: {e}")
         return {"success": False, "error": f"Error inesperado asignando orden: {str(e)}"}
 
-def process_order_assignment(cedula, order_number):
-    """Procesar asignación completa de orden a comercial"""
+def _resolve_assignment_comercial(cedula, comercial_token=None):
+    """Paso 1 de la asignación: comercial y su ID (token vigente o consulta a NocoDB)"""
+    cedula_validation = validate_cedula_format(cedula)
+    if cedula_validation["valid"]:
+        verified_comercial = get_verified_lookup(comercial_token, "comercial", cedula_validation["cleaned_cedula"])
+        if verified_comercial is not None:
+            logger.info(f"♻️ Reusing verified comercial lookup for cedula {cedula}")
+            return {
+                "success": True,
+                "comercial_id": verified_comercial["comercial_id"],
+                "comercial_data": verified_comercial["comercial_data"]
+            }
+    
+    comercial_result = get_comercial_by_cedula(cedula, fields=COMERCIAL_LOOKUP_FIELDS)
+    if not comercial_result.get("success"):
+        return {"success": False, "error": comercial_result.get("error")}
+    
+    if not comercial_result.get("found"):
+        return {"success": False, "error": comercial_result.get("message")}
+    
+    return {
+        "success": True,
+        "comercial_id": comercial_result.get("comercial_id"),
+        "comercial_data": comercial_result.get("comercial_data")
+    }
+
+def _resolve_assignment_order(order_number, order_token=None):
+    """Paso 2 de la asignación: orden existente y normalizada (token vigente o consulta a NocoDB)"""
+    order_validation = validate_order_number_format(order_number)
+    if order_validation["valid"]:
+        normalized_order = order_validation["normalized_order"]
+        if get_verified_lookup(order_token, "order", normalized_order) is not None:
+            logger.info(f"♻️ Reusing verified order lookup for {normalized_order}")
+            return {"success": True, "normalized_order": normalized_order}
+    
+    # Solo importa si existe: contar sin descargar la orden
+    order_result = check_order_exists(order_number, count_only=True)
+    if not order_result.get("success"):
+        return {"success": False, "error": order_result.get("error")}
+    
+    if not order_result.get("exists"):
+        return {"success": False, "error": order_result.get("message")}
+    
+    return {"success": True, "normalized_order": order_result.get("normalized_order")}
+
+def _timed_call(fn, *args):
+    """Ejecutar fn y retornar (resultado, milisegundos)"""
+    start_time = time.time()
+    result = fn(*args)
+    return result, round((time.time() - start_time) * 1000, 1)
+
+def process_order_assignment(cedula, order_number, comercial_token=None, order_token=None,
+                             write_behind=False, notify_chat_id=None):
+    """Procesar asignación completa de orden a comercial (los tokens evitan re-verificar)"""
     try:
         logger.info(f"🎯 Processing order assignment: {order_number} to cedula {cedula}")
+        start_time = time.time()
+        
+        # Pasos 1 y 2 son independientes: consultar comercial y orden en paralelo
+        comercial_future = _lookup_executor.submit(_timed_call, _resolve_assignment_comercial, cedula, comercial_token)
+        order_future = _lookup_executor.submit(_timed_call, _resolve_assignment_order, order_number, order_token)
+        comercial_result, comercial_ms = comercial_future.result()
+        order_result, order_ms = order_future.result()
         
-        # Paso 1: Verificar comercial y obtener ID
-        comercial_result = get_comercial_by_cedula(cedula)
+        # Mismo orden de errores que el flujo secuencial: primero el comercial
         if not comercial_result.get("success"):
             return {"success": False, "error": comercial_result.get("error")}
         
-        if not comercial_result.get("found"):
-            return {"success": False, "error": comercial_result.get("message")}
-        
-        comercial_id = comercial_result.get("comercial_id")
-        comercial_data = comercial_result.get("comercial_data")
-        
-        # Paso 2: Verificar que la orden existe
-        order_result = check_order_exists(order_number)
         if not order_result.get("success"):
             return {"success": False, "error": order_result.get("error")}
         
-        if not order_result.get("exists"):
-            return {"success": False, "error": order_result.get("message")}
-        
+        comercial_id = comercial_result.get("comercial_id")
+        comercial_data = comercial_result.get("comercial_data")
         normalized_order = order_result.get("normalized_order")
         
-        # Paso 3: Asignar orden al comercial
-        assignment_result = assign_order_to_comercial(normalized_order, comercial_id)
+        # Paso 3: Asignar orden al comercial (o registrarla en el journal si la escritura es diferida)
+        queued = write_behind and assignment_journal.is_running()
+        if queued:
+            assignment_result, assignment_ms = _timed_call(
+                _journal_assignment, normalized_order, comercial_id, comercial_data, notify_chat_id
+            )
+            queued = assignment_result.get("success")
+        if not queued:
+            assignment_result, assignment_ms = _timed_call(assign_order_to_comercial, normalized_order, comercial_id)
         if not assignment_result.get("success"):
             return {"success": False, "error": assignment_result.get("error")}
         
@@ -689,7 +958,14 @@ def process_order_assignment(cedula, order_number):
                 "order_number": normalized_order,
                 "comercial_id": comercial_id,
                 "comercial_name": comercial_data.get('name'),
-                "comercial_cedula": comercial_data.get('cedula')
+                "comercial_cedula": comercial_data.get('cedula'),
+                "queued": queued,
+                "timings_ms": {
+                    "comercial_lookup": comercial_ms,
+                    "order_lookup": order_ms,
+                    "assignment": assignment_ms,
+                    "total": round((time.time() - start_time) * 1000, 1)
+                }
             },
             "assignment_data": assignment_result.get("assignment_data")
         }
@@ -698,6 +974,460 @@ def process_order_assignment(cedula, order_number):
         logger.error(f"❌ Error processing order assignment: {e}")
         return {"success": False, "error": f"Error procesando asignación: {str(e)}"}
 
+# ===== ESCRITURA DIFERIDA DE ASIGNACIONES =====
+
+def _send_assignment_batch(payloads):
+    """Enviar un lote del journal; los errores 4xx (salvo 429) no se reintentan"""
+    results = create_records_batch(NOCODB_ASSIGNMENTS_TABLE_ID, payloads)
+    for result in results:
+        status_code = result.get("status_code")
+        if status_code is not None and status_code < 500 and status_code != 429:
+            result["retryable"] = False
+    return results
+
+def _find_recorded_assignments(payloads):
+    """Por cada payload, si NocoDB ya tiene esa asignación (orden y comercial); consulta por order_number"""
+    url = f"{NOCODB_BASE_URL}/tables/{NOCODB_ASSIGNMENTS_TABLE_ID}/records"
+    headers = {
+        "accept": "application/json",
+        "xc-token": NOCODB_TOKEN
+    }
+    
+    recorded = set()
+    order_numbers = sorted({str(payload["order_number"]) for payload in payloads})
+    for chunk in _chunks(order_numbers, NOCODB_BULK_CHUNK_SIZE):
+        params = {
+            "where": f"(order_number,in,{','.join(chunk)})",
+            "fields": "order_number,commercial_ext",
+            "limit": len(chunk),
+            "shuffle": 0,
+            "offset": 0
+        }
+        
+        logger.info(f"📡 Checking {len(chunk)} journaled assignments in one request")
+        
+        while True:
+            response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+            
+            if response.status_code != 200:
+                raise RuntimeError(f"Error consultando asignaciones: HTTP {response.status_code}")
+            
+            data = response.json()
+            records = data.get("list", [])
+            for record in records:
+                recorded.add((str(record.get("order_number")), str(record.get("commercial_ext"))))
+            
+            if data.get("pageInfo", {}).get("isLastPage", True) or not records:
+                break
+            params["offset"] += len(records)
+    
+    return [(str(payload["order_number"]), str(payload["commercial_ext"])) in recorded for payload in payloads]
+
+def _notify_assignment_failure(entry, error):
+    """Avisar al usuario que una asignación ya confirmada no se pudo registrar"""
+    chat_id = entry["context"].get("chat_id")
+    if not chat_id:
+        return
+    
+    message = f"""❌ **No se pudo registrar la asignación**
+
+📦 **Orden:** {entry['payload'].get('order_number')}
+👤 **Comercial:** {entry['context'].get('comercial_name', entry['payload'].get('commercial_ext'))}
+
+**Error:** {error}
+
+🔄 **Intenta nuevamente:** Escribe 'orden'"""
+    send_telegram_message(chat_id, message)
+
+assignment_journal = AssignmentJournal(
+    ASSIGNMENT_JOURNAL_PATH,
+    _send_assignment_batch,
+    _notify_assignment_failure,
+    batch_size=ASSIGNMENT_BATCH_SIZE,
+    max_attempts=ASSIGNMENT_MAX_ATTEMPTS,
+    retry_interval=ASSIGNMENT_RETRY_INTERVAL,
+    linger=ASSIGNMENT_BATCH_LINGER,
+    check_delivered=_find_recorded_assignments
+)
+
+_journal_lock_fd = None
+
+def start_assignment_journal():
+    """Iniciar el drenado del journal de asignaciones (reenvía lo pendiente de ejecuciones previas)"""
+    if not ASSIGNMENT_WRITE_BEHIND:
+        logger.info("ℹ️ Assignment write-behind disabled")
+        return False
+    
+    try:
+        # Con varios workers solo uno es dueño del journal; el resto asigna de forma sincrónica
+        global _journal_lock_fd
+        if _journal_lock_fd is None:
+            _journal_lock_fd = acquire_refresher_lock(f"{ASSIGNMENT_JOURNAL_PATH}.lock")
+        if _journal_lock_fd is None:
+            logger.info("ℹ️ Assignment journal owned by another worker, assigning synchronously")
+            return False
+        return assignment_journal.start()
+    except OSError as e:
+        logger.error(f"❌ Could not open assignment journal {ASSIGNMENT_JOURNAL_PATH}: {e}")
+        return False
+
+def _journal_assignment(normalized_order, comercial_id, comercial_data, notify_chat_id=None):
+    """Registrar la asignación en el journal local; se envía a NocoDB en segundo plano"""
+    try:
+        payload = {
+            "order_number": normalized_order,
+            "commercial_ext": comercial_id
+        }
+        context = {"chat_id": notify_chat_id, "comercial_name": comercial_data.get('name')}
+        entry_id = assignment_journal.append(payload, context)
+        logger.info(f"📒 Assignment {normalized_order} -> {comercial_id} journaled as {entry_id}")
+        return {"success": True, "assignment_data": {"journal_id": entry_id, **payload}}
+        
+    except Exception as e:
+        logger.error(f"❌ Error journaling assignment: {e}")
+        return {"success": False, "error": f"Error registrando asignación: {str(e)}"}
+
+def get_assignment_journal_stats():
+    """Estado del journal de asignaciones para /health"""
+    if not ASSIGNMENT_WRITE_BEHIND:
+        return {"enabled": False}
+    return dict(assignment_journal.get_stats(), enabled=True)
+
+# ===== ASIGNACIÓN MASIVA =====
+
+def _chunks(items, size):
+    """Dividir una lista en bloques de tamaño fijo"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def fetch_orders_by_numbers(normalized_orders):
+    """Consultar varias órdenes con filtros `in` (un request por bloque)"""
+    try:
+        url = f"{NOCODB_BASE_URL}/tables/{NOCODB_ORDERS_TABLE_ID}/records"
+        headers = {
+            "accept": "application/json",
+            "xc-token": NOCODB_TOKEN
+        }
+        
+        orders = {}
+        for chunk in _chunks(normalized_orders, NOCODB_BULK_CHUNK_SIZE):
+            params = {
+                "where": f"(order_number,in,{','.join(chunk)})",
+                "fields": "order_number",
+                "limit": len(chunk),
+                "shuffle": 0,
+                "offset": 0
+            }
+            
+            logger.info(f"📡 Checking {len(chunk)} orders in one request")
+            
+            # Páginas adicionales solo si hay órdenes con registros repetidos
+            while True:
+                response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+                
+                if response.status_code != 200:
+                    logger.error(f"❌ NocoDB HTTP Error: {response.status_code} - {response.text}")
+                    return {"success": False, "error": f"Error consultando órdenes: HTTP {response.status_code}"}
+                
+                data = response.json()
+                records = data.get("list", [])
+                for record in records:
+                    orders.setdefault(record.get("order_number"), record)
+                
+                if data.get("pageInfo", {}).get("isLastPage", True) or not records:
+                    break
+                params["offset"] += len(records)
+        
+        return {"success": True, "orders": orders}
+        
+    except RateLimitExceeded as e:
+        logger.warning(f"⏳ NocoDB rate limit reached: {e}")
+        return {"success": False, "error": "NocoDB está recibiendo demasiadas solicitudes. Intenta en unos segundos."}
+    
+    except requests.exceptions.Timeout:
+        logger.error(f"❌ Timeout checking orders in bulk")
+        return {"success": False, "error": "Timeout al verificar órdenes. Intenta nuevamente."}
+    
+    except requests.exceptions.ConnectionError:
+        logger.error(f"❌ Connection error checking orders in bulk")
+        return {"success": False, "error": "Error de conexión con NocoDB. Verifica la conectividad."}
+        
+    except Exception as e:
+        logger.error(f"❌ Unexpected error checking orders in bulk: {e}")
+        return {"success": False, "error": f"Error verificando órdenes: {str(e)}"}
+
+def create_records_batch(table_id, payloads):
+    """Insertar varios registros con POST de arreglo (un request por bloque); retorna un resultado por payload"""
+    url = f"{NOCODB_BASE_URL}/tables/{table_id}/records"
+    headers = {
+        "accept": "application/json",
+        "xc-token": NOCODB_TOKEN,
+        "Content-Type": "application/json"
+    }
+    
+    results = []
+    for chunk in _chunks(payloads, NOCODB_BULK_CHUNK_SIZE):
+        try:
+            logger.info(f"📡 Inserting {len(chunk)} records in table {table_id}")
+            response = get_http_session("nocodb").post(url, json=chunk, headers=headers, timeout=NOCODB_TIMEOUT)
+            
+            if response.status_code in [200, 201]:
+                created = response.json()
+                if not isinstance(created, list):
+                    created = [created]
+                # NocoDB retorna los Ids en el mismo orden de los registros enviados
+                for position in range(len(chunk)):
+                    record = created[position] if position < len(created) else {}
+                    results.append({"success": True, "record": record})
+            else:
+                logger.error(f"❌ NocoDB batch insert error: {response.status_code} - {response.text}")
+                error = f"Error en inserción masiva (HTTP {response.status_code})"
+                results.extend({"success": False, "error": error, "status_code": response.status_code} for _ in chunk)
+                
+        except Exception as e:
+            logger.error(f"❌ Error in batch insert: {e}")
+            results.extend({"success": False, "error": f"Error en inserción masiva: {str(e)}"} for _ in chunk)
+    
+    return results
+
+def process_bulk_order_assignment(items):
+    """Asignar varias órdenes: cédulas distintas una vez, órdenes en una consulta e inserción por lotes"""
+    try:
+        start_time = time.time()
+        logger.info(f"🎯 Processing bulk order assignment: {len(items)} items")
+        
+        results = []
+        pending = []  # (índice, cédula limpia, orden normalizada)
+        
+        # Paso 1: Validar formatos de todos los pares
+        for index, item in enumerate(items):
+            result = {"index": index, "cedula": None, "order_number": None, "success": False}
+            results.append(result)
+            
+            if not isinstance(item, dict) or not item.get("cedula") or not item.get("order_number"):
+                result["error"] = "Campos requeridos: cedula, order_number"
+                continue
+            
+            result["cedula"] = item["cedula"]
+            result["order_number"] = item["order_number"]
+            
+            cedula_validation = validate_cedula_format(item["cedula"])
+            if not cedula_validation["valid"]:
+                result["error"] = cedula_validation["error"]
+                continue
+            
+            order_validation = validate_order_number_format(item["order_number"])
+            if not order_validation["valid"]:
+                result["error"] = order_validation["error"]
+                continue
+            
+            result["order_number"] = order_validation["normalized_order"]
+            pending.append((index, cedula_validation["cleaned_cedula"], order_validation["normalized_order"]))
+        
+        # Paso 2: Resolver cada cédula distinta una sola vez (en paralelo) y todas las órdenes en bloque
+        lookup_start = time.time()
+        distinct_cedulas = sorted({cedula for _, cedula, _ in pending})
+        distinct_orders = sorted({order for _, _, order in pending})
+        
+        comercial_futures = {
+            cedula: _lookup_executor.submit(get_comercial_by_cedula, cedula, COMERCIAL_LOOKUP_FIELDS)
+            for cedula in distinct_cedulas
+        }
+        orders_result = fetch_orders_by_numbers(distinct_orders) if distinct_orders else {"success": True, "orders": {}}
+        comerciales = {cedula: future.result() for cedula, future in comercial_futures.items()}
+        lookup_ms = round((time.time() - lookup_start) * 1000, 1)
+        
+        if not orders_result.get("success"):
+            return {"success": False, "error": orders_result.get("error")}
+        
+        existing_orders = orders_result["orders"]
+        
+        # Paso 3: Armar las asignaciones válidas (una orden se asigna una sola vez por solicitud)
+        to_create = []
+        seen_orders = set()
+        for index, cedula, order in pending:
+            result = results[index]
+            comercial_result = comerciales[cedula]
+            
+            if not comercial_result.get("success"):
+                result["error"] = comercial_result.get("error")
+            elif not comercial_result.get("found"):
+                result["error"] = comercial_result.get("message")
+            elif order not in existing_orders:
+                result["error"] = f"La orden {order} no existe en el sistema"
+            elif order in seen_orders:
+                result["error"] = f"La orden {order} está repetida en la solicitud"
+            else:
+                seen_orders.add(order)
+                result["comercial_id"] = comercial_result.get("comercial_id")
+                result["comercial_name"] = comercial_result.get("comercial_data", {}).get("name")
+                to_create.append(index)
+        
+        # Paso 4: Crear todas las asignaciones en lotes
+        insert_start = time.time()
+        payloads = [
+            {"order_number": results[index]["order_number"], "commercial_ext": results[index]["comercial_id"]}
+            for index in to_create
+        ]
+        created = create_records_batch(NOCODB_ASSIGNMENTS_TABLE_ID, payloads) if payloads else []
+        insert_ms = round((time.time() - insert_start) * 1000, 1)
+        
+        for index, insert_result in zip(to_create, created):
+            if insert_result.get("success"):
+                results[index]["success"] = True
+                results[index]["assignment_data"] = insert_result.get("record")
+            else:
+                results[index]["error"] = insert_result.get("error")
+        
+        assigned = sum(1 for result in results if result["success"])
+        logger.info(f"✅ Bulk assignment completed: {assigned}/{len(items)} assigned")
+        
+        return {
+            "success": True,
+            "total": len(items),
+            "assigned": assigned,
+            "failed": len(items) - assigned,
+            "results": results,
+            "timings_ms": {
+                "lookups": lookup_ms,
+                "insert": insert_ms,
+                "total": round((time.time() - start_time) * 1000, 1)
+            }
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Error processing bulk order assignment: {e}")
+        return {"success": False, "error": f"Error procesando asignación masiva: {str(e)}"}
+
+# ===== IMPORTACIÓN MASIVA DE COMERCIALES =====
+
+def fetch_existing_cedulas(cedulas):
+    """Cédulas que ya existen en NocoDB, consultadas con filtros `in` por bloques"""
+    url = f"{NOCODB_BASE_URL}/tables/{NOCODB_TABLE_ID}/records"
+    headers = {
+        "accept": "application/json",
+        "xc-token": NOCODB_TOKEN
+    }
+    
+    existing = set()
+    for chunk in _chunks(cedulas, NOCODB_BULK_CHUNK_SIZE):
+        params = {
+            "where": f"(cedula,in,{','.join(chunk)})",
+            "fields": "cedula",
+            "limit": len(chunk),
+            "shuffle": 0,
+            "offset": 0
+        }
+        
+        logger.info(f"📡 Checking {len(chunk)} cedulas in one request")
+        
+        # Páginas adicionales si NocoDB limita el tamaño de página o hay cédulas repetidas
+        while True:
+            response = get_http_session("nocodb").get(url, params=params, headers=headers, timeout=NOCODB_TIMEOUT)
+            
+            if response.status_code != 200:
+                raise RuntimeError(f"Error consultando cédulas: HTTP {response.status_code}")
+            
+            data = response.json()
+            records = data.get("list", [])
+            for record in records:
+                if record.get("cedula"):
+                    existing.add(validate_cedula_format(record["cedula"]).get("cleaned_cedula", str(record["cedula"])))
+            
+            if data.get("pageInfo", {}).get("isLastPage", True) or not records:
+                break
+            params["offset"] += len(records)
+    
+    return existing
+
+def parse_comerciales_csv(text):
+    """Leer un CSV con encabezados cedula, email, name, phone (sin distinguir mayúsculas)"""
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    return [
+        {str(key).strip().lower(): (value or "").strip() for key, value in row.items() if key is not None}
+        for row in reader
+    ]
+
+def import_comerciales(rows):
+    """Importar comerciales por lotes; genera un reporte por fila y un resumen final"""
+    start_time = time.time()
+    counts = {"created": 0, "invalid": 0, "duplicate_in_file": 0, "exists": 0, "error": 0}
+    logger.info(f"📥 Importing {len(rows)} comerciales")
+    
+    # Paso 1: Validar todas las filas y detectar duplicados dentro del archivo
+    valid_rows = []  # (fila, datos limpios)
+    first_seen = {}
+    for row_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            counts["invalid"] += 1
+            yield {"row": row_number, "status": "invalid", "errors": ["Formato de fila inválido"]}
+            continue
+        
+        clean_data, errors = validate_comercial_fields(row.get("cedula"), row.get("email"), row.get("name"), row.get("phone"))
+        
+        if errors:
+            counts["invalid"] += 1
+            yield {"row": row_number, "cedula": row.get("cedula"), "status": "invalid", "errors": errors}
+            continue
+        
+        if clean_data["cedula"] in first_seen:
+            counts["duplicate_in_file"] += 1
+            yield {
+                "row": row_number,
+                "cedula": clean_data["cedula"],
+                "status": "duplicate_in_file",
+                "errors": [f"Cédula repetida (fila {first_seen[clean_data['cedula']]})"]
+            }
+            continue
+        
+        first_seen[clean_data["cedula"]] = row_number
+        valid_rows.append((row_number, clean_data))
+    
+    # Paso 2: Una consulta por bloque para las cédulas que ya existen en NocoDB
+    try:
+        existing = fetch_existing_cedulas([clean_data["cedula"] for _, clean_data in valid_rows])
+    except Exception as e:
+        logger.error(f"❌ Error checking existing cedulas: {e}")
+        counts["error"] += len(valid_rows)
+        for row_number, clean_data in valid_rows:
+            yield {"row": row_number, "cedula": clean_data["cedula"], "status": "error", "errors": [str(e)]}
+        valid_rows = []
+        existing = set()
+    
+    to_create = []
+    for row_number, clean_data in valid_rows:
+        if clean_data["cedula"] in existing:
+            counts["exists"] += 1
+            yield {
+                "row": row_number,
+                "cedula": clean_data["cedula"],
+                "status": "exists",
+                "errors": [f"El comercial con cédula {clean_data['cedula']} ya está registrado en el sistema"]
+            }
+        else:
+            to_create.append((row_number, clean_data))
+    
+    # Paso 3: Insertar por lotes y reportar cada bloque apenas termina
+    for chunk in _chunks(to_create, NOCODB_BULK_CHUNK_SIZE):
+        created = create_records_batch(NOCODB_TABLE_ID, [clean_data for _, clean_data in chunk])
+        
+        for (row_number, clean_data), insert_result in zip(chunk, created):
+            if insert_result.get("success"):
+                counts["created"] += 1
+                record = insert_result.get("record") or {}
+                if COMERCIALES_REPLICA_ENABLED:
+                    comerciales_replica.upsert(dict(clean_data, **record))
+                yield {"row": row_number, "cedula": clean_data["cedula"], "status": "created", "id": record.get("Id")}
+            else:
+                counts["error"] += 1
+                yield {"row": row_number, "cedula": clean_data["cedula"], "status": "error", "errors": [insert_result.get("error")]}
+    
+    logger.info(f"✅ Import completed: {counts}")
+    yield {
+        "summary": dict(counts, total=len(rows)),
+        "elapsed_ms": round((time.time() - start_time) * 1000, 1)
+    }
+
 def format_comercial_info(comercial_data):
     """Formatear información del comercial para mostrar"""
     try:
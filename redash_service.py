@@ -1,138 +1,789 @@
 # 🗄️ redash_service.py - Servicio de Datos Redash v1.0
-import requests
 import logging
+import os
+import threading
 import time
+from collections.abc import Mapping
 from config import *
+from utils import get_single_flight
+from http_client import get_http_session
+from redash_stream import RedashResultStream
+from client_store import ClientStore
+from cache_snapshot import write_snapshot, load_snapshot, snapshot_path, snapshot_file_id, acquire_refresher_lock
 
 logger = logging.getLogger(__name__)
 
-def get_clients_from_redash():
-    """Obtener clientes desde Redash con cache optimizado"""
-    current_time = time.time()
+# ===== ÍNDICE DE DOCUMENTOS =====
+POTENTIAL_DOC_FIELDS = [
+    'nit', 'cedula', 'documento', 'doc_number', 'identification',
+    'tax_id', 'client_id', 'customer_id', 'id_number', 'cc'
+]
+
+# Campos que se muestran al comercial (format_client_info / get_client_summary_text)
+CLIENT_DISPLAY_FIELDS = [
+    'nombre', 'name', 'client_name', 'razon_social', 'business_name', 'company_name', 'customer_name',
+    'legal_name', 'representante_legal', 'rep_legal', 'legal_representative',
+    'phone_number', 'telefono', 'phone', 'celular', 'movil', 'contact_phone',
+    'email', 'correo', 'mail', 'contact_email',
+    'address', 'direccion', 'domicilio', 'ubicacion', 'street_address',
+    'ciudad', 'city', 'municipio', 'locality',
+    'departamento', 'estado', 'state', 'region'
+]
+
+def normalize_document(value):
+    """Normalizar número de documento para comparación"""
+    return str(value).strip().replace('-', '').replace('.', '').replace(' ', '')
+
+def detect_document_columns(columns):
+    """Identificar columnas de documento (todas las columnas si no hay coincidencias)"""
+    doc_columns = []
+
+    for col in columns:
+        col_name = col.get('name', '').lower()
+        if any(field in col_name for field in POTENTIAL_DOC_FIELDS):
+            doc_columns.append(col.get('name'))
+
+    # Si no se encuentran columnas específicas, usar todas las columnas
+    if not doc_columns:
+        doc_columns = [col.get('name') for col in columns]
+
+    return doc_columns
+
+def index_document_row(index, position, client, doc_columns):
+    """Agregar una fila al índice documento normalizado -> [(posición, columna)]"""
+    if not isinstance(client, Mapping):
+        return
+
+    # Una sola entrada por fila y documento: la primera columna que coincide
+    seen_docs = set()
+    for col_name in doc_columns:
+        if col_name in client and client[col_name]:
+            client_doc = normalize_document(client[col_name])
+            if client_doc in seen_docs:
+                continue
+            seen_docs.add(client_doc)
+            index.setdefault(client_doc, []).append((position, col_name))
+
+def index_membership_row(index, position, client, doc_columns):
+    """Agregar una fila al índice documento normalizado -> (posición, columna) con la primera coincidencia"""
+    if not isinstance(client, Mapping):
+        return
+
+    for col_name in doc_columns:
+        if col_name in client and client[col_name]:
+            index.setdefault(normalize_document(client[col_name]), (position, col_name))
+
+def build_document_index(clients, doc_columns):
+    """Construir índice documento normalizado -> [(posición, columna)] en orden de filas"""
+    index = {}
+    for position, client in enumerate(clients):
+        index_document_row(index, position, client, doc_columns)
+    return index
+
+def build_membership_index(clients, doc_columns):
+    """Construir índice documento normalizado -> (posición, columna) con la primera coincidencia"""
+    index = {}
+    for position, client in enumerate(clients):
+        index_membership_row(index, position, client, doc_columns)
+    return index
+
+def scan_clients_for_document(clients, doc_columns, clean_doc_number, doc_type):
+    """Buscar documento recorriendo todos los registros (fallback sin índice)"""
+    matching_clients = []
+
+    for i, client in enumerate(clients):
+        if not isinstance(client, Mapping):
+            continue
+
+        # Buscar en columnas de documento
+        for col_name in doc_columns:
+            if col_name in client and client[col_name]:
+                client_doc = normalize_document(client[col_name])
+
+                # Comparación exacta
+                if clean_doc_number == client_doc:
+                    logger.info(f"✅ Match found in client {i+1}, column {col_name}: {client_doc}")
+                    matching_clients.append({
+                        "client_data": dict(client),
+                        "matched_field": col_name,
+                        "matched_value": client[col_name],
+                        "search_type": f"{doc_type}_{clean_doc_number}"
+                    })
+                    break
+
+    return matching_clients
+
+def find_first_document_match(clients, doc_columns, clean_doc_number):
+    """Buscar la primera fila que contiene el documento (fallback sin índice)"""
+    for position, client in enumerate(clients):
+        if not isinstance(client, Mapping):
+            continue
+
+        for col_name in doc_columns:
+            if col_name in client and client[col_name]:
+                if clean_doc_number == normalize_document(client[col_name]):
+                    return position, col_name
+
+    return None
+
+# ===== DATASETS REDASH =====
+REDASH_DATASETS = {
+    "clients": {
+        "cache": clients_cache,
+        "query_id": REDASH_QUERY_ID,
+        "api_key": REDASH_API_KEY,
+        "label": "clients",
+        "index_row": index_document_row,
+        "display_fields": CLIENT_DISPLAY_FIELDS,
+        "delta_query_id": REDASH_DELTA_QUERY_ID
+    },
+    "unavailable": {
+        "cache": unavailable_clients_cache,
+        "query_id": REDASH_UNAVAILABLE_QUERY_ID,
+        "api_key": REDASH_UNAVAILABLE_API_KEY,
+        "label": "unavailable clients",
+        "index_row": index_membership_row,
+        "display_fields": None,  # Se conservan todas las columnas
+        "delta_query_id": None
+    }
+}
+
+# Hilos de refresco en segundo plano por dataset
+_refresh_threads = {}
+_refresh_lock = threading.Lock()
+_scheduler_thread = None
+
+# Cache compartido: fd del lock de refresco por dataset y última revisión del archivo
+_refresher_locks = {}
+_shared_checks = {}
+
+def select_projected_columns(columns, doc_columns, display_fields):
+    """Columnas a conservar en memoria (None = todas)"""
+    if not REDASH_PROJECT_COLUMNS or display_fields is None:
+        return None
     
-    # Verificar cache
-    if (clients_cache["data"] is not None and 
-        current_time - clients_cache["timestamp"] < clients_cache["ttl"]):
-        logger.info("✅ Using cached clients data")
-        return {"success": True, "data": clients_cache["data"], "cached": True, "total": len(clients_cache["data"])}
+    column_names = [col.get('name') for col in columns]
     
-    # Fetch fresh data
-    try:
-        url = f"{REDASH_BASE_URL}/api/queries/{REDASH_QUERY_ID}/results.json"
-        params = {'api_key': REDASH_API_KEY}
+    # Sin campos de visualización conocidos, conservar todo para el formato de respaldo
+    if not any(col_name in display_fields for col_name in column_names):
+        return None
+    
+    wanted = set(doc_columns) | set(display_fields) | set(REDASH_KEEP_COLUMNS)
+    if REDASH_DELTA_QUERY_ID:
+        # El refresco incremental necesita la marca y la identidad de cada fila
+        wanted |= {REDASH_DELTA_COLUMN, REDASH_DELTA_KEY_COLUMN}
+    keep_columns = [col_name for col_name in column_names if col_name in wanted]
+    
+    return keep_columns if len(keep_columns) < len(column_names) else None
+
+class DatasetIngest:
+    """Proyectar e indexar las filas de un dataset a medida que llegan"""
+    
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.columns = None
+        self.source_columns_count = 0
+        self.doc_columns = None
+        self.clients = None
+        self.doc_index = {}
+        self._pending_rows = []
+    
+    def set_columns(self, columns):
+        """Registrar columnas, crear el almacén columnar y procesar filas recibidas antes"""
+        self.source_columns_count = len(columns)
+        self.doc_columns = detect_document_columns(columns)
+        keep_columns = select_projected_columns(columns, self.doc_columns, self.dataset["display_fields"])
+        
+        if keep_columns is None:
+            self.columns = columns
+        else:
+            keep = set(keep_columns)
+            self.columns = [col for col in columns if col.get('name') in keep]
+        
+        # El almacén solo guarda las columnas conservadas (proyección implícita)
+        self.clients = ClientStore([col.get('name') for col in self.columns])
         
-        logger.info(f"🔄 Fetching clients from Redash Query {REDASH_QUERY_ID}")
-        response = requests.get(url, params=params, timeout=REDASH_TIMEOUT)
+        pending_rows, self._pending_rows = self._pending_rows, []
+        for row in pending_rows:
+            self.add_row(row)
+    
+    def add_row(self, row):
+        """Guardar la fila como tupla e indexarla"""
+        if self.doc_columns is None:
+            self._pending_rows.append(row)
+            return
+        
+        position = self.clients.append(row)
+        if position is not None:
+            self.dataset["index_row"](self.doc_index, position, row, self.doc_columns)
+    
+    def finish(self):
+        """Cerrar la ingesta (sin columnas se usan las claves de la primera fila)"""
+        if self.doc_columns is None:
+            first_row = next((row for row in self._pending_rows if isinstance(row, Mapping)), {})
+            self.set_columns([{"name": col_name} for col_name in first_row])
+
+def ingest_redash_response(dataset, response):
+    """Parsear la respuesta de Redash en streaming o completa según configuración"""
+    ingest = DatasetIngest(dataset)
+    
+    if REDASH_STREAMING:
+        stream = RedashResultStream(response.iter_content(chunk_size=REDASH_STREAM_CHUNK_SIZE))
+        stream.read(ingest.set_columns, ingest.add_row)
+        logger.info(f"🌊 Streamed {stream.bytes_read:,} bytes from Redash")
+    else:
+        data = response.json()
+        
+        # Extraer datos de la estructura de Redash
+        query_result = data.get('query_result', {})
+        ingest.set_columns(query_result.get('data', {}).get('columns', []))
+        for row in query_result.get('data', {}).get('rows', []):
+            ingest.add_row(row)
+    
+    ingest.finish()
+    return ingest
+
+def fetch_redash_dataset(name):
+    """Descargar, parsear e indexar un dataset de Redash sin modificar el cache"""
+    dataset = REDASH_DATASETS[name]
+    label = dataset["label"]
+    
+    try:
+        url = f"{REDASH_BASE_URL}/api/queries/{dataset['query_id']}/results.json"
+        params = {'api_key': dataset["api_key"]}
         
-        logger.info(f"📡 Redash Response: {response.status_code}")
+        logger.info(f"🔄 Fetching {label} from Redash Query {dataset['query_id']}")
+        response = get_http_session("redash").get(url, params=params, timeout=REDASH_TIMEOUT, stream=REDASH_STREAMING)
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extraer datos de la estructura de Redash
-            query_result = data.get('query_result', {})
-            clients = query_result.get('data', {}).get('rows', [])
-            columns = query_result.get('data', {}).get('columns', [])
+        try:
+            logger.info(f"📡 Redash Response: {response.status_code}")
             
-            logger.info(f"📊 Columns available: {[col.get('name') for col in columns]}")
-            logger.info(f"✅ Retrieved {len(clients)} clients from Redash")
+            if response.status_code != 200:
+                logger.error(f"❌ Redash HTTP {response.status_code}: {response.text}")
+                return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
             
-            # Actualizar cache
-            clients_cache["data"] = {
+            # Proyectar columnas y construir índice mientras se leen las filas
+            ingest = ingest_redash_response(dataset, response)
+        finally:
+            response.close()
+        
+        clients = ingest.clients
+        columns = ingest.columns
+        
+        logger.info(f"📊 Columns kept: {[col.get('name') for col in columns]} (of {ingest.source_columns_count})")
+        logger.info(f"✅ Retrieved {len(clients)} {label} from Redash")
+        logger.info(f"🗂️ Document index built for {label}: {len(ingest.doc_index)} keys over columns {ingest.doc_columns}")
+        
+        return {
+            "success": True,
+            "data": {
                 "clients": clients,
                 "columns": columns,
+                "doc_columns": ingest.doc_columns,
+                "doc_index": ingest.doc_index,
                 "metadata": {
                     "total_rows": len(clients),
                     "columns_count": len(columns),
-                    "last_updated": current_time
+                    "source_columns_count": ingest.source_columns_count,
+                    "memory": clients.memory_stats(),
+                    "last_updated": time.time(),
+                    "last_full_refresh": time.time(),
+                    "delta_watermark": compute_delta_watermark(clients) if dataset.get("delta_query_id") else None
                 }
             }
-            clients_cache["timestamp"] = current_time
-            
-            return {
-                "success": True, 
-                "data": clients_cache["data"], 
-                "cached": False,
-                "total": len(clients)
-            }
-        else:
-            logger.error(f"❌ Redash HTTP {response.status_code}: {response.text}")
-            # Fallback a cache expirado si existe
-            if clients_cache["data"] is not None:
-                logger.info("⚠️ Using expired cache due to API error")
-                return {"success": True, "data": clients_cache["data"], "cached": True, "expired": True}
-            return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
-            
+        }
+        
     except Exception as e:
-        logger.error(f"❌ Error fetching clients: {e}")
-        # Fallback a cache expirado
-        if clients_cache["data"] is not None:
-            logger.info("⚠️ Using expired cache due to exception")
-            return {"success": True, "data": clients_cache["data"], "cached": True, "expired": True}
+        logger.error(f"❌ Error fetching {label}: {e}")
         return {"success": False, "error": str(e)}
 
-def get_unavailable_clients_from_redash():
-    """Obtener clientes no disponibles desde Redash con cache optimizado"""
-    current_time = time.time()
+def refresh_redash_dataset(name):
+    """Refrescar un dataset (una sola descarga concurrente por dataset)"""
+    return get_single_flight(f"redash:{name}").do(name, _refresh_redash_dataset_now, name)
+
+def _refresh_redash_dataset_now(name):
+    """Descargar un dataset y reemplazar el cache con un intercambio atómico"""
+    if shared_cache_enabled():
+        if not is_shared_cache_refresher(name):
+            # Otro worker descarga: solo mapear el archivo que publica
+            result = reload_shared_snapshot(name)
+            if not result.get("snapshot_missing"):
+                return result
+            logger.info(f"⚠️ No shared snapshot yet for {REDASH_DATASETS[name]['label']}, fetching locally")
+        else:
+            return _refresh_shared_dataset(name)
     
-    # Verificar cache
-    if (unavailable_clients_cache["data"] is not None and 
-        current_time - unavailable_clients_cache["timestamp"] < unavailable_clients_cache["ttl"]):
-        logger.info("✅ Using cached unavailable clients data")
-        return {"success": True, "data": unavailable_clients_cache["data"], "cached": True}
+    if delta_refresh_due(name):
+        result = refresh_dataset_delta(name)
+        if result.get("success"):
+            return result
+        logger.warning(f"⚠️ Delta refresh failed, falling back to full refresh: {result.get('error')}")
     
-    # Fetch fresh data
-    try:
-        url = f"{REDASH_BASE_URL}/api/queries/{REDASH_UNAVAILABLE_QUERY_ID}/results.json"
-        params = {'api_key': REDASH_UNAVAILABLE_API_KEY}
+    result = fetch_redash_dataset(name)
+    
+    if result.get("success"):
+        cache = REDASH_DATASETS[name]["cache"]
+        new_data = result["data"]
+        # Los lectores ven el dataset anterior o el nuevo, nunca uno a medias
+        cache["data"] = new_data
+        cache["timestamp"] = new_data["metadata"]["last_updated"]
+        save_dataset_snapshot(name, new_data, cache["timestamp"])
+    
+    return result
+
+# ===== REFRESCO INCREMENTAL =====
+
+def run_parameterized_query(query_id, api_key, parameters, timeout=REDASH_TIMEOUT):
+    """Ejecutar una query parametrizada de Redash y esperar su resultado"""
+    headers = {'Authorization': f'Key {api_key}'}
+    url = f"{REDASH_BASE_URL}/api/queries/{query_id}/results"
+    
+    response = get_http_session("redash").post(url, headers=headers, json={"parameters": parameters, "max_age": 0}, timeout=timeout)
+    if response.status_code != 200:
+        return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+    
+    payload = response.json()
+    deadline = time.time() + timeout
+    
+    # Redash responde con el resultado en cache o con un job que hay que esperar
+    while "query_result" not in payload:
+        job = payload.get("job", {})
+        status = job.get("status")
+        
+        if status == 3:
+            result_url = f"{REDASH_BASE_URL}/api/query_results/{job.get('query_result_id')}.json"
+            response = get_http_session("redash").get(result_url, headers=headers, timeout=timeout)
+            if response.status_code != 200:
+                return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+            payload = response.json()
+            break
+        
+        if status in (4, 5):
+            return {"success": False, "error": job.get("error") or "Query cancelada o fallida en Redash"}
+        
+        if time.time() >= deadline:
+            return {"success": False, "error": f"Timeout esperando job {job.get('id')} de Redash"}
+        
+        time.sleep(REDASH_JOB_POLL_INTERVAL)
+        response = get_http_session("redash").get(f"{REDASH_BASE_URL}/api/jobs/{job.get('id')}", headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+        payload = response.json()
+    
+    query_data = payload.get("query_result", {}).get("data", {})
+    return {"success": True, "columns": query_data.get("columns", []), "rows": query_data.get("rows", [])}
+
+def compute_delta_watermark(clients, watermark=None):
+    """Mayor valor de la columna incremental (None si la columna no existe)"""
+    for client in clients:
+        value = client.get(REDASH_DELTA_COLUMN)
+        if value is None:
+            continue
+        try:
+            if watermark is None or value > watermark:
+                watermark = value
+        except TypeError:
+            continue
+    return watermark
+
+def delta_refresh_due(name):
+    """El refresco incremental aplica sobre un almacén en memoria y entre descargas completas"""
+    dataset = REDASH_DATASETS[name]
+    data = dataset["cache"]["data"]
+    
+    if not dataset.get("delta_query_id") or data is None:
+        return False
+    
+    # Los snapshots mapeados son de solo lectura: se reemplazan con una descarga completa
+    if not isinstance(data["clients"], ClientStore):
+        return False
+    
+    metadata = data["metadata"]
+    if metadata.get("delta_watermark") is None:
+        return False
+    
+    return time.time() - metadata.get("last_full_refresh", 0) < REDASH_FULL_REFRESH_INTERVAL
+
+def delta_key_column(data):
+    """Columna que identifica cada fila para fusionar cambios"""
+    return REDASH_DELTA_KEY_COLUMN or (data["doc_columns"][0] if data["doc_columns"] else None)
+
+def merge_delta_rows(data, rows):
+    """Fusionar filas cambiadas en el almacén y el índice del dataset en caliente"""
+    clients = data["clients"]
+    doc_index = data["doc_index"]
+    doc_columns = data["doc_columns"]
+    key_column = delta_key_column(data)
+    
+    # Posición de cada fila por su clave, construida una vez y mantenida entre deltas
+    row_positions = data.get("row_positions")
+    if row_positions is None:
+        row_positions = {}
+        for position, client in enumerate(clients):
+            if client.get(key_column) is not None:
+                row_positions[normalize_document(client[key_column])] = position
+        data["row_positions"] = row_positions
+    
+    inserted = 0
+    updated = 0
+    
+    for row in rows:
+        if not isinstance(row, Mapping) or row.get(key_column) is None:
+            continue
         
-        logger.info(f"🔄 Fetching unavailable clients from Redash Query {REDASH_UNAVAILABLE_QUERY_ID}")
-        response = requests.get(url, params=params, timeout=REDASH_TIMEOUT)
+        row_key = normalize_document(row[key_column])
+        position = row_positions.get(row_key)
         
-        logger.info(f"📡 Redash Response: {response.status_code}")
+        if position is None:
+            position = clients.append(row)
+            if position is None:
+                continue
+            row_positions[row_key] = position
+            old_entries = {}
+            inserted += 1
+        else:
+            old_entries = {}
+            index_document_row(old_entries, position, clients[position], doc_columns)
+            clients.replace(position, row)
+            updated += 1
+        
+        new_entries = {}
+        index_document_row(new_entries, position, clients[position], doc_columns)
+        
+        # Lista final por clave asignada de una vez: los lectores nunca ven una clave ausente ni a medio modificar
+        for client_doc in new_entries:
+            others = [match for match in doc_index.get(client_doc, []) if match[0] != position]
+            doc_index[client_doc] = sorted(others + new_entries[client_doc])
+        
+        # Solo se quitan las claves que la fila ya no tiene
+        for client_doc in old_entries.keys() - new_entries.keys():
+            unindex_document_position(doc_index, client_doc, position)
+    
+    return inserted, updated
+
+def unindex_document_position(index, client_doc, position):
+    """Quitar las entradas de una posición bajo una clave del índice documento -> [(posición, columna)]"""
+    remaining = [match for match in index.get(client_doc, []) if match[0] != position]
+    if remaining:
+        index[client_doc] = remaining
+    else:
+        index.pop(client_doc, None)
+
+def refresh_dataset_delta(name):
+    """Descargar solo las filas cambiadas desde la última marca y fusionarlas"""
+    dataset = REDASH_DATASETS[name]
+    cache = dataset["cache"]
+    label = dataset["label"]
+    data = cache["data"]
+    metadata = data["metadata"]
+    watermark = metadata["delta_watermark"]
+    
+    try:
+        logger.info(f"🔄 Fetching {label} changed since {watermark} from Redash Query {dataset['delta_query_id']}")
+        result = run_parameterized_query(
+            dataset["delta_query_id"],
+            REDASH_DELTA_API_KEY,
+            {REDASH_DELTA_PARAMETER: str(watermark)}
+        )
+        
+        if not result.get("success"):
+            return result
+        
+        rows = result["rows"]
+        inserted, updated = merge_delta_rows(data, rows)
+        
+        current_time = time.time()
+        data["metadata"] = dict(
+            metadata,
+            total_rows=len(data["clients"]),
+            memory=data["clients"].memory_stats(),
+            last_updated=current_time,
+            delta_watermark=compute_delta_watermark(rows, watermark),
+            last_delta={"rows": len(rows), "inserted": inserted, "updated": updated, "at": current_time}
+        )
+        cache["timestamp"] = current_time
+        
+        logger.info(f"✅ Delta merged for {label}: {len(rows)} rows ({inserted} new, {updated} updated)")
+        save_dataset_snapshot(name, data, current_time)
+        
+        return {"success": True, "data": data}
         
-        if response.status_code == 200:
-            data = response.json()
+    except Exception as e:
+        logger.error(f"❌ Error in delta refresh of {label}: {e}")
+        return {"success": False, "error": str(e)}
+
+# ===== CACHE COMPARTIDO ENTRE WORKERS =====
+
+def shared_cache_enabled():
+    """El cache compartido necesita un directorio de snapshots"""
+    return SHARED_CACHE and bool(CACHE_SNAPSHOT_DIR)
+
+def is_shared_cache_refresher(name):
+    """Elegir un único worker refrescador por dataset mediante flock no bloqueante"""
+    if name in _refresher_locks:
+        return True
+    
+    with _refresh_lock:
+        if name not in _refresher_locks:
+            fd = acquire_refresher_lock(snapshot_path(CACHE_SNAPSHOT_DIR, name) + ".lock")
+            if fd is None:
+                return False
+            _refresher_locks[name] = fd
+            logger.info(f"👑 Worker {os.getpid()} is the shared cache refresher for {REDASH_DATASETS[name]['label']}")
+    
+    return True
+
+def _refresh_shared_dataset(name):
+    """Refrescador: descargar, publicar el snapshot y servir la copia mapeada"""
+    result = fetch_redash_dataset(name)
+    
+    if not result.get("success"):
+        return result
+    
+    new_data = result["data"]
+    timestamp = new_data["metadata"]["last_updated"]
+    path = snapshot_path(CACHE_SNAPSHOT_DIR, name)
+    
+    try:
+        size = write_snapshot(path, new_data, timestamp)
+        if size is None:
+            logger.info(f"ℹ️ Newer shared snapshot already on disk for {REDASH_DATASETS[name]['label']}, not replaced")
+        else:
+            logger.info(f"💾 Shared snapshot published for {REDASH_DATASETS[name]['label']}: {size:,} bytes")
+    except Exception as e:
+        # Sin archivo compartido, este worker sigue con su copia en memoria
+        logger.error(f"❌ Error publishing shared snapshot for {REDASH_DATASETS[name]['label']}: {e}")
+        cache = REDASH_DATASETS[name]["cache"]
+        cache["data"] = new_data
+        cache["timestamp"] = timestamp
+        return result
+    
+    # También el refrescador lee del archivo mapeado y libera la copia descargada
+    return reload_shared_snapshot(name)
+
+def reload_shared_snapshot(name):
+    """Mapear el snapshot publicado si cambió respecto al que usa este worker"""
+    cache = REDASH_DATASETS[name]["cache"]
+    label = REDASH_DATASETS[name]["label"]
+    path = snapshot_path(CACHE_SNAPSHOT_DIR, name)
+    _shared_checks[name] = time.time()
+    
+    file_id = snapshot_file_id(path)
+    if file_id is None:
+        return {"success": False, "error": "Snapshot compartido no disponible", "snapshot_missing": True}
+    
+    current_data = cache["data"]
+    if current_data is not None and current_data["metadata"].get("snapshot", {}).get("file_id") == file_id:
+        return {"success": True, "data": current_data}
+    
+    try:
+        data, timestamp = load_snapshot(path, use_mmap=True)
+    except Exception as e:
+        logger.error(f"❌ Error mapping shared snapshot for {label}: {e}")
+        return {"success": False, "error": str(e)}
+    
+    cache["data"] = data
+    cache["timestamp"] = timestamp
+    logger.info(f"🔗 Mapped shared {label} snapshot: {len(data['clients'])} rows")
+    return {"success": True, "data": data}
+
+def sync_shared_snapshot(name):
+    """Revisar (con intervalo mínimo) si el refrescador publicó un snapshot nuevo"""
+    if not shared_cache_enabled() or name in _refresher_locks:
+        return
+    
+    if time.time() - _shared_checks.get(name, 0) < SHARED_CACHE_CHECK_INTERVAL:
+        return
+    
+    reload_shared_snapshot(name)
+
+def get_shared_cache_status():
+    """Estado del cache compartido para /health"""
+    if not shared_cache_enabled():
+        return {"enabled": False}
+    
+    return {
+        "enabled": True,
+        "pid": os.getpid(),
+        "refresher_for": sorted(_refresher_locks),
+        "datasets": {
+            name: (dataset["cache"]["data"] or {}).get("metadata", {}).get("snapshot")
+            for name, dataset in REDASH_DATASETS.items()
+        }
+    }
+
+# ===== SNAPSHOTS EN DISCO =====
+
+def save_dataset_snapshot(name, data, timestamp):
+    """Escribir el snapshot del dataset en segundo plano tras un refresco"""
+    if not CACHE_SNAPSHOT_DIR:
+        return False
+    
+    # Copia tomada en el hilo del refresco: un delta posterior no altera el archivo a medio escribir
+    if isinstance(data["clients"], ClientStore):
+        data = dict(data, clients=data["clients"].copy(), doc_index=dict(data["doc_index"]))
+    
+    thread = threading.Thread(
+        target=_write_dataset_snapshot,
+        args=(name, data, timestamp),
+        name=f"redash-snapshot-{name}",
+        daemon=True
+    )
+    thread.start()
+    return True
+
+def _write_dataset_snapshot(name, data, timestamp):
+    """Escribir snapshot con reemplazo atómico del archivo anterior"""
+    path = snapshot_path(CACHE_SNAPSHOT_DIR, name)
+    try:
+        start_time = time.time()
+        size = write_snapshot(path, data, timestamp)
+        if size is None:
+            logger.info(f"ℹ️ Newer snapshot already on disk for {REDASH_DATASETS[name]['label']}, skipped")
+            return
+        logger.info(f"💾 Snapshot saved for {REDASH_DATASETS[name]['label']}: {size:,} bytes in {time.time() - start_time:.2f}s")
+    except Exception as e:
+        logger.error(f"❌ Error saving snapshot for {REDASH_DATASETS[name]['label']}: {e}")
+
+def load_cache_snapshots():
+    """Cargar los snapshots en disco en los caches vacíos (arranque en caliente)"""
+    if not CACHE_SNAPSHOT_DIR:
+        logger.info("ℹ️ Cache snapshots disabled")
+        return {}
+    
+    loaded = {}
+    current_time = time.time()
+    
+    for name, dataset in REDASH_DATASETS.items():
+        cache = dataset["cache"]
+        label = dataset["label"]
+        path = snapshot_path(CACHE_SNAPSHOT_DIR, name)
+        
+        if cache["data"] is not None or not os.path.exists(path):
+            continue
+        
+        try:
+            start_time = time.time()
+            data, timestamp = load_snapshot(path, use_mmap=CACHE_SNAPSHOT_MMAP or shared_cache_enabled())
+            age = current_time - timestamp
             
-            # Extraer datos de la estructura de Redash
-            query_result = data.get('query_result', {})
-            clients = query_result.get('data', {}).get('rows', [])
-            columns = query_result.get('data', {}).get('columns', [])
+            if age > CACHE_SNAPSHOT_MAX_AGE:
+                logger.warning(f"⚠️ Ignoring {label} snapshot: {age:.0f}s old (max {CACHE_SNAPSHOT_MAX_AGE}s)")
+                continue
             
-            logger.info(f"📊 Unavailable clients: {len(clients)} records with {len(columns)} columns")
+            cache["data"] = data
+            cache["timestamp"] = timestamp
+            loaded[name] = len(data["clients"])
+            logger.info(f"💾 Loaded {len(data['clients'])} {label} from snapshot in {(time.time() - start_time) * 1000:.0f}ms ({age:.0f}s old)")
             
-            # Actualizar cache
-            unavailable_clients_cache["data"] = {
-                "clients": clients,
-                "columns": columns,
-                "metadata": {
-                    "total_rows": len(clients),
-                    "columns_count": len(columns),
-                    "last_updated": current_time
-                }
-            }
-            unavailable_clients_cache["timestamp"] = current_time
+            # Poner el snapshot al día sin bloquear el arranque
+            if age >= cache["ttl"] - CACHE_REFRESH_MARGIN:
+                start_background_refresh(name)
+                
+        except Exception as e:
+            logger.error(f"❌ Error loading {label} snapshot: {e}")
+    
+    return loaded
+
+def start_background_refresh(name):
+    """Lanzar refresco en segundo plano si no hay uno en curso para el dataset"""
+    with _refresh_lock:
+        thread = _refresh_threads.get(name)
+        if thread is not None and thread.is_alive():
+            return False
+        
+        thread = threading.Thread(
+            target=refresh_redash_dataset,
+            args=(name,),
+            name=f"redash-refresh-{name}",
+            daemon=True
+        )
+        _refresh_threads[name] = thread
+        thread.start()
+    
+    logger.info(f"🔄 Background refresh started for {REDASH_DATASETS[name]['label']}")
+    return True
+
+def get_redash_dataset(name):
+    """Obtener dataset de Redash sirviendo el cache vigente mientras se revalida"""
+    dataset = REDASH_DATASETS[name]
+    cache = dataset["cache"]
+    label = dataset["label"]
+    
+    # Con cache compartido, adoptar el snapshot más reciente publicado por el refrescador
+    sync_shared_snapshot(name)
+    current_time = time.time()
+    
+    cached_data = cache["data"]
+    if cached_data is not None:
+        if current_time - cache["timestamp"] < cache["ttl"]:
+            logger.info(f"✅ Using cached {label} data")
+            return {"success": True, "data": cached_data, "cached": True}
+        
+        # Cache expirado: servir datos actuales y refrescar en segundo plano
+        logger.info(f"⚠️ Serving stale {label} data while refreshing")
+        start_background_refresh(name)
+        return {"success": True, "data": cached_data, "cached": True, "stale": True}
+    
+    # Cache vacío: descargar en línea (se une a un refresco en curso si existe)
+    result = refresh_redash_dataset(name)
+    if not result.get("success"):
+        return {"success": False, "error": result.get("error")}
+    
+    return {"success": True, "data": result["data"], "cached": False}
+
+def get_clients_from_redash():
+    """Obtener clientes desde Redash con cache optimizado"""
+    result = get_redash_dataset("clients")
+    
+    if result.get("success"):
+        result["total"] = len(result["data"]["clients"])
+    
+    return result
+
+def get_unavailable_clients_from_redash():
+    """Obtener clientes no disponibles desde Redash con cache optimizado"""
+    return get_redash_dataset("unavailable")
+
+def start_cache_scheduler():
+    """Iniciar hilo que refresca los caches de Redash poco antes de expirar"""
+    global _scheduler_thread
+    
+    if not CACHE_SCHEDULER_ENABLED:
+        logger.info("ℹ️ Cache scheduler disabled")
+        return False
+    
+    if _scheduler_thread is not None and _scheduler_thread.is_alive():
+        return False
+    
+    _scheduler_thread = threading.Thread(target=_cache_scheduler_loop, name="redash-cache-scheduler", daemon=True)
+    _scheduler_thread.start()
+    logger.info(f"⏰ Cache scheduler started (refresh margin {CACHE_REFRESH_MARGIN}s)")
+    return True
+
+def _cache_scheduler_loop():
+    """Bucle del scheduler: refrescar cada dataset antes de su expiración"""
+    while True:
+        try:
+            current_time = time.time()
+            next_wake = current_time + CACHE_REFRESH_RETRY
             
-            return {
-                "success": True, 
-                "data": unavailable_clients_cache["data"], 
-                "cached": False
-            }
-        else:
-            logger.error(f"❌ Redash HTTP {response.status_code}: {response.text}")
-            # Fallback a cache expirado si existe
-            if unavailable_clients_cache["data"] is not None:
-                logger.info("⚠️ Using expired unavailable clients cache due to API error")
-                return {"success": True, "data": unavailable_clients_cache["data"], "cached": True, "expired": True}
-            return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+            for name, dataset in REDASH_DATASETS.items():
+                cache = dataset["cache"]
+                due_at = cache["timestamp"] + cache["ttl"] - CACHE_REFRESH_MARGIN
+                
+                if cache["data"] is None or current_time >= due_at:
+                    start_background_refresh(name)
+                    # Revisar de nuevo tras el intervalo de reintento
+                    due_at = current_time + CACHE_REFRESH_RETRY
+                
+                next_wake = min(next_wake, due_at)
             
-    except Exception as e:
-        logger.error(f"❌ Error fetching unavailable clients: {e}")
-        # Fallback a cache expirado
-        if unavailable_clients_cache["data"] is not None:
-            logger.info("⚠️ Using expired unavailable clients cache due to exception")
-            return {"success": True, "data": unavailable_clients_cache["data"], "cached": True, "expired": True}
-        return {"success": False, "error": str(e)}
+            time.sleep(max(1, next_wake - time.time()))
+            
+        except Exception as e:
+            logger.error(f"❌ Cache scheduler error: {e}")
+            time.sleep(CACHE_REFRESH_RETRY)
 
 def check_if_client_unavailable(doc_type, doc_number):
     """Verificar si un cliente está en la lista de no disponibles"""
@@ -155,42 +806,26 @@ def check_if_client_unavailable(doc_type, doc_number):
             logger.info("ℹ️ No unavailable clients data - client is available")
             return {"success": True, "unavailable": False}
         
-        # Identificar columnas de documento
-        doc_columns = []
-        potential_doc_fields = [
-            'nit', 'cedula', 'documento', 'doc_number', 'identification', 
-            'tax_id', 'client_id', 'customer_id', 'id_number', 'cc'
-        ]
-        
-        for col in columns:
-            col_name = col.get('name', '').lower()
-            if any(field in col_name for field in potential_doc_fields):
-                doc_columns.append(col.get('name'))
-        
-        # Si no hay columnas específicas, usar todas
-        if not doc_columns:
-            doc_columns = [col.get('name') for col in columns]
-        
         # Limpiar número de documento
-        clean_doc_number = str(doc_number).strip().replace('-', '').replace('.', '').replace(' ', '')
+        clean_doc_number = normalize_document(doc_number)
         
-        # Buscar en clientes no disponibles
-        for client in clients:
-            if not isinstance(client, dict):
-                continue
-                
-            for col_name in doc_columns:
-                if col_name in client and client[col_name]:
-                    client_doc = str(client[col_name]).strip().replace('-', '').replace('.', '').replace(' ', '')
-                    
-                    if clean_doc_number == client_doc:
-                        logger.info(f"🚫 Client found in unavailable list: {doc_type} {doc_number}")
-                        return {
-                            "success": True, 
-                            "unavailable": True,
-                            "client_data": client,
-                            "matched_field": col_name
-                        }
+        doc_index = data.get("doc_index")
+        if doc_index is not None:
+            # Una sola consulta al índice, sin importar el tamaño de la lista
+            match = doc_index.get(clean_doc_number)
+        else:
+            doc_columns = data.get("doc_columns") or detect_document_columns(columns)
+            match = find_first_document_match(clients, doc_columns, clean_doc_number)
+        
+        if match is not None:
+            position, col_name = match
+            logger.info(f"🚫 Client found in unavailable list: {doc_type} {doc_number}")
+            return {
+                "success": True, 
+                "unavailable": True,
+                "client_data": dict(clients[position]),
+                "matched_field": col_name
+            }
         
         logger.info(f"✅ Client is available: {doc_type} {doc_number}")
         return {"success": True, "unavailable": False}
@@ -199,104 +834,7 @@ def check_if_client_unavailable(doc_type, doc_number):
         logger.error(f"❌ Error checking client availability: {e}")
         # En caso de error, asumir que está disponible para no bloquear
         return {"success": True, "unavailable": False, "error": str(e)}
-    """Buscar cliente por tipo y número de documento"""
-    try:
-        logger.info(f"🔍 Starting search for {doc_type}: {doc_number}")
-        
-        # Obtener data de clientes
-        data_result = get_clients_from_redash()
-        
-        if not data_result.get("success"):
-            logger.error(f"❌ Failed to get clients data: {data_result.get('error')}")
-            return {"success": False, "error": data_result.get("error"), "found": False}
-        
-        data = data_result.get("data", {})
-        clients = data.get("clients", [])
-        columns = data.get("columns", [])
-        
-        logger.info(f"📊 Got {len(clients)} clients and {len(columns)} columns")
-        
-        if not clients:
-            logger.warning("⚠️ No clients data available")
-            return {"success": True, "found": False, "message": "No hay datos de clientes disponibles"}
-        
-        # Identificar columnas relevantes para búsqueda de documentos
-        doc_columns = []
-        potential_doc_fields = [
-            'nit', 'cedula', 'documento', 'doc_number', 'identification', 
-            'tax_id', 'client_id', 'customer_id', 'id_number', 'cc'
-        ]
-        
-        for col in columns:
-            col_name = col.get('name', '').lower()
-            if any(field in col_name for field in potential_doc_fields):
-                doc_columns.append(col.get('name'))
-        
-        logger.info(f"🔍 Found potential document columns: {doc_columns}")
-        
-        # Si no se encuentran columnas específicas, buscar en todas las columnas
-        if not doc_columns:
-            doc_columns = [col.get('name') for col in columns]
-            logger.info(f"🔍 Using all columns as fallback: {len(doc_columns)} columns")
-        
-        # Limpiar número de documento para comparación
-        clean_doc_number = str(doc_number).strip().replace('-', '').replace('.', '').replace(' ', '')
-        logger.info(f"🔍 Cleaned document number: {clean_doc_number}")
-        
-        matching_clients = []
-        
-        # Buscar en todos los registros
-        for i, client in enumerate(clients):
-            if not isinstance(client, dict):
-                continue
-                
-            # Buscar en columnas de documento
-            for col_name in doc_columns:
-                if col_name in client and client[col_name]:
-                    client_doc = str(client[col_name]).strip().replace('-', '').replace('.', '').replace(' ', '')
-                    
-                    # Comparación exacta
-                    if clean_doc_number == client_doc:
-                        logger.info(f"✅ Match found in client {i+1}, column {col_name}: {client_doc}")
-                        matching_clients.append({
-                            "client_data": client,
-                            "matched_field": col_name,
-                            "matched_value": client[col_name],
-                            "search_type": f"{doc_type}_{clean_doc_number}"
-                        })
-                        break
-        
-        logger.info(f"🔍 Search completed: {len(matching_clients)} matches found")
-        
-        if matching_clients:
-            logger.info(f"✅ Found {len(matching_clients)} matching clients for {doc_type}: {doc_number}")
-            return {
-                "success": True,
-                "found": True,
-                "matches": matching_clients,
-                "total_matches": len(matching_clients),
-                "search_criteria": {
-                    "doc_type": doc_type,
-                    "doc_number": doc_number,
-                    "cleaned_number": clean_doc_number
-                }
-            }
-        else:
-            logger.info(f"❌ No matches found for {doc_type}: {doc_number}")
-            return {
-                "success": True,
-                "found": False,
-                "message": f"No se encontró cliente con {doc_type}: {doc_number}",
-                "search_criteria": {
-                    "doc_type": doc_type,
-                    "doc_number": doc_number,
-                    "cleaned_number": clean_doc_number
-                },
-                "total_clients_searched": len(clients)
-            }
-            
-    except Exception as e:
-        logger.error(f"❌ Error searching client: {e}")
+
 def search_client_by_document_with_availability(doc_type, doc_number):
     """Buscar cliente implementando flujo de disponibilidad comercial"""
     try:
@@ -338,6 +876,13 @@ def search_client_by_document(doc_type, doc_number):
     try:
         logger.info(f"🔍 Starting search for {doc_type}: {doc_number}")
         
+        # Cache frío: consulta puntual a Redash mientras el dataset completo se descarga
+        if REDASH_LOOKUP_QUERY_ID and clients_cache["data"] is None:
+            lookup_result = search_client_by_document_lookup(doc_type, doc_number)
+            if lookup_result.get("success"):
+                return lookup_result
+            logger.warning(f"⚠️ Point lookup failed, waiting for full dataset: {lookup_result.get('error')}")
+        
         # Obtener data de clientes
         data_result = get_clients_from_redash()
         
@@ -355,51 +900,32 @@ def search_client_by_document(doc_type, doc_number):
             logger.warning("⚠️ No clients data available")
             return {"success": True, "found": False, "message": "No hay datos de clientes disponibles"}
         
-        # Identificar columnas relevantes para búsqueda de documentos
-        doc_columns = []
-        potential_doc_fields = [
-            'nit', 'cedula', 'documento', 'doc_number', 'identification', 
-            'tax_id', 'client_id', 'customer_id', 'id_number', 'cc'
-        ]
-        
-        for col in columns:
-            col_name = col.get('name', '').lower()
-            if any(field in col_name for field in potential_doc_fields):
-                doc_columns.append(col.get('name'))
-        
-        logger.info(f"🔍 Found potential document columns: {doc_columns}")
-        
-        # Si no se encuentran columnas específicas, buscar en todas las columnas
-        if not doc_columns:
-            doc_columns = [col.get('name') for col in columns]
-            logger.info(f"🔍 Using all columns as fallback: {len(doc_columns)} columns")
-        
         # Limpiar número de documento para comparación
-        clean_doc_number = str(doc_number).strip().replace('-', '').replace('.', '').replace(' ', '')
+        clean_doc_number = normalize_document(doc_number)
         logger.info(f"🔍 Cleaned document number: {clean_doc_number}")
         
-        matching_clients = []
-        
-        # Buscar en todos los registros
-        for i, client in enumerate(clients):
-            if not isinstance(client, dict):
-                continue
-                
-            # Buscar en columnas de documento
-            for col_name in doc_columns:
-                if col_name in client and client[col_name]:
-                    client_doc = str(client[col_name]).strip().replace('-', '').replace('.', '').replace(' ', '')
-                    
-                    # Comparación exacta
-                    if clean_doc_number == client_doc:
-                        logger.info(f"✅ Match found in client {i+1}, column {col_name}: {client_doc}")
-                        matching_clients.append({
-                            "client_data": client,
-                            "matched_field": col_name,
-                            "matched_value": client[col_name],
-                            "search_type": f"{doc_type}_{clean_doc_number}"
-                        })
-                        break
+        doc_index = data.get("doc_index")
+        
+        if doc_index is not None:
+            # Búsqueda O(1) en el índice construido al refrescar el cache
+            matching_clients = []
+            for position, col_name in doc_index.get(clean_doc_number, []):
+                client = clients[position]
+                # Un delta en curso pudo reemplazar la fila antes de quitar su clave anterior
+                if normalize_document(client.get(col_name, "")) != clean_doc_number:
+                    continue
+                logger.info(f"✅ Match found in client {position+1}, column {col_name}: {clean_doc_number}")
+                matching_clients.append({
+                    "client_data": dict(client),
+                    "matched_field": col_name,
+                    "matched_value": client[col_name],
+                    "search_type": f"{doc_type}_{clean_doc_number}"
+                })
+        else:
+            # Fallback: recorrido lineal si el índice no está disponible
+            logger.info("⚠️ Document index not available, using linear scan")
+            doc_columns = data.get("doc_columns") or detect_document_columns(columns)
+            matching_clients = scan_clients_for_document(clients, doc_columns, clean_doc_number, doc_type)
         
         logger.info(f"🔍 Search completed: {len(matching_clients)} matches found")
         
@@ -433,37 +959,57 @@ def search_client_by_document(doc_type, doc_number):
     except Exception as e:
         logger.error(f"❌ Error searching client: {e}")
         return {"success": False, "error": str(e), "found": False}
-        
-        if matching_clients:
-            logger.info(f"✅ Found {len(matching_clients)} matching clients for {doc_type}: {doc_number}")
-            return {
-                "success": True,
-                "found": True,
-                "matches": matching_clients,
-                "total_matches": len(matching_clients),
-                "search_criteria": {
-                    "doc_type": doc_type,
-                    "doc_number": doc_number,
-                    "cleaned_number": clean_doc_number
-                }
-            }
-        else:
-            logger.info(f"❌ No matches found for {doc_type}: {doc_number}")
-            return {
-                "success": True,
-                "found": False,
-                "message": f"No se encontró cliente con {doc_type}: {doc_number}",
-                "search_criteria": {
-                    "doc_type": doc_type,
-                    "doc_number": doc_number,
-                    "cleaned_number": clean_doc_number
-                },
-                "total_clients_searched": len(clients)
-            }
-            
+
+def search_client_by_document_lookup(doc_type, doc_number):
+    """Buscar un documento con la query puntual de Redash (sin descargar el dataset)"""
+    # El dataset completo se calienta en segundo plano para las siguientes búsquedas
+    start_background_refresh("clients")
+    
+    clean_doc_number = normalize_document(doc_number)
+    search_criteria = {
+        "doc_type": doc_type,
+        "doc_number": doc_number,
+        "cleaned_number": clean_doc_number
+    }
+    
+    try:
+        logger.info(f"🎯 Cold cache, point lookup in Redash Query {REDASH_LOOKUP_QUERY_ID}: {clean_doc_number}")
+        result = run_parameterized_query(
+            REDASH_LOOKUP_QUERY_ID,
+            REDASH_LOOKUP_API_KEY,
+            {REDASH_LOOKUP_PARAMETER: clean_doc_number},
+            timeout=REDASH_LOOKUP_TIMEOUT
+        )
     except Exception as e:
-        logger.error(f"❌ Error searching client: {e}")
         return {"success": False, "error": str(e), "found": False}
+    
+    if not result.get("success"):
+        return {"success": False, "error": result.get("error"), "found": False}
+    
+    # La query filtra en el servidor; se verifica igual la coincidencia exacta
+    rows = result["rows"]
+    doc_columns = detect_document_columns(result["columns"])
+    matching_clients = scan_clients_for_document(rows, doc_columns, clean_doc_number, doc_type)
+    
+    logger.info(f"🎯 Point lookup completed: {len(matching_clients)} matches in {len(rows)} rows")
+    
+    if matching_clients:
+        return {
+            "success": True,
+            "found": True,
+            "matches": matching_clients,
+            "total_matches": len(matching_clients),
+            "search_criteria": search_criteria,
+            "source": "redash_lookup"
+        }
+    
+    return {
+        "success": True,
+        "found": False,
+        "message": f"No se encontró cliente con {doc_type}: {doc_number}",
+        "search_criteria": search_criteria,
+        "source": "redash_lookup"
+    }
 
 def get_clients_summary():
     """Obtener resumen de clientes disponibles"""
@@ -492,11 +1038,12 @@ def get_clients_summary():
             "total_clients": len(clients),
             "total_columns": len(columns),
             "last_updated": metadata.get("last_updated"),
-            "cached": data_result.get("cached", False)
+            "cached": data_result.get("cached", False),
+            "memory": metadata.get("memory", {})
         }
         
         # Muestra de datos (primeros 3 registros)
-        sample_clients = clients[:3] if clients else []
+        sample_clients = [dict(client) for client in clients[:3]] if clients else []
         
         return {
             "success": True,
@@ -535,7 +1082,7 @@ def validate_document_number(doc_type, doc_number):
 def format_client_info(client_data, matched_field=None):
     """Formatear información del cliente para mostrar - LIMPIO Y PROFESIONAL"""
     try:
-        if not isinstance(client_data, dict):
+        if not isinstance(client_data, Mapping):
             return "❌ Formato de cliente inválido"
         
         logger.info(f"🔍 Formatting client data with {len(client_data)} fields")
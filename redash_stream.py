@@ -0,0 +1,135 @@
+# 🌊 redash_stream.py - Lectura Incremental de Resultados Redash v1.0
+import codecs
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+JSON_WHITESPACE = " \t\r\n"
+JSON_NUMBER_CHARS = "0123456789+-.eE"
+
+class RedashResultStream:
+    """Lector incremental de query_result.data (columns/rows) sobre un stream de bytes"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.bytes_read = 0
+
+    def read(self, on_columns, on_row):
+        """Recorrer la respuesta llamando on_columns(columns) y on_row(row) por cada fila"""
+        rows_found = False
+
+        for key in self._iter_object():
+            if key != "query_result":
+                self._value()
+                continue
+
+            for result_key in self._iter_object():
+                if result_key != "data":
+                    self._value()
+                    continue
+
+                for data_key in self._iter_object():
+                    if data_key == "columns":
+                        on_columns(self._value() or [])
+                    elif data_key == "rows":
+                        self._read_rows(on_row)
+                        rows_found = True
+                    else:
+                        self._value()
+
+        if not rows_found:
+            logger.warning("⚠️ Redash response without query_result.data.rows")
+
+        return rows_found
+
+    def _read_rows(self, on_row):
+        """Entregar cada fila del arreglo rows sin materializar el arreglo completo"""
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+
+        while True:
+            on_row(self._value())
+            char = self._peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"JSON inválido en rows: se esperaba ',' o ']' y llegó '{char}'")
+
+    def _iter_object(self):
+        """Recorrer las claves de un objeto; quien itera debe consumir cada valor"""
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key
+            char = self._peek()
+            self._pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"JSON inválido: se esperaba ',' o '}}' y llegó '{char}'")
+
+    def _value(self):
+        """Decodificar el siguiente valor JSON completo, leyendo más datos si hace falta"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+                # Un número al final del buffer puede estar cortado: pedir más datos
+                if not self._eof and (end == len(self._buffer) or self._buffer[end] in JSON_NUMBER_CHARS):
+                    raise ValueError("Valor posiblemente incompleto")
+                self._pos = end
+                return value
+            except ValueError:
+                if not self._fill():
+                    raise
+
+    def _expect(self, char):
+        """Consumir el carácter estructural esperado"""
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"JSON inválido: se esperaba '{char}' y llegó '{found}'")
+        self._pos += 1
+
+    def _peek(self):
+        """Siguiente carácter no blanco, sin consumirlo"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in JSON_WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Respuesta JSON incompleta")
+
+    def _fill(self):
+        """Agregar el siguiente bloque al buffer descartando lo ya consumido"""
+        if self._eof:
+            return False
+
+        text = ""
+        for chunk in self._chunks:
+            if chunk:
+                self.bytes_read += len(chunk)
+                text = self._decoder.decode(chunk)
+                if text:
+                    break
+        else:
+            text = self._decoder.decode(b"", final=True)
+            self._eof = True
+
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return bool(text) or self._eof
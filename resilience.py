@@ -0,0 +1,281 @@
+# 🛡️ resilience.py - Reintentos, Circuit Breaker y Límite de Tasa por Servicio v1.0
+import requests
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from config import *
+
+logger = logging.getLogger(__name__)
+
+# Métodos que se pueden repetir sin efectos secundarios
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """El servicio está marcado como caído: se falla de inmediato sin llamar"""
+
+class CircuitBreaker:
+    """Circuit breaker closed -> open -> half_open por servicio externo"""
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0
+        self._probe_in_flight = False
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self):
+        """Permitir la llamada o lanzar CircuitOpenError si el circuito está abierto"""
+        with self._lock:
+            self._stats["calls"] += 1
+
+            if self._state == "open":
+                if time.time() - self._opened_at < self.reset_timeout:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(f"Servicio {self.name} no disponible temporalmente")
+                self._state = "half_open"
+                self._probe_in_flight = False
+
+            if self._state == "half_open":
+                # Una sola llamada de prueba; el resto falla rápido hasta conocer su resultado
+                if self._probe_in_flight:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(f"Servicio {self.name} no disponible temporalmente")
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != "closed":
+                logger.info(f"✅ Circuit {self.name} closed")
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            self._probe_in_flight = False
+
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["opened"] += 1
+                    logger.warning(f"⚠️ Circuit {self.name} opened after {self._failures} failures")
+                self._state = "open"
+                self._opened_at = time.time()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._state
+            stats["consecutive_failures"] = self._failures
+            if self._state == "open":
+                stats["retry_in_seconds"] = round(max(0, self.reset_timeout - (time.time() - self._opened_at)), 1)
+        return stats
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(name):
+    """Obtener (o crear) el circuit breaker de un servicio"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+            _breakers[name] = breaker
+        return breaker
+
+def get_circuit_breaker_stats():
+    """Estado de todos los circuit breakers para /health"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_stats() for breaker in breakers}
+
+def retry_delay(attempt):
+    """Espera con backoff exponencial y jitter completo"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+def call_upstream(breaker, method, send, limiter=None):
+    """Ejecutar send() bajo el limitador y el circuit breaker, reintentando solo métodos idempotentes"""
+    retries = UPSTREAM_READ_RETRIES if method.upper() in IDEMPOTENT_METHODS else 0
+    attempt = 0
+    throttled_retries = 0
+
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        breaker.before_call()
+        last_attempt = attempt >= retries
+
+        # Solo se reintenta si no hubo conexión: un ReadTimeout ya esperó el timeout completo y no se repite
+        try:
+            response = send()
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+            breaker.record_failure()
+            if last_attempt:
+                raise
+            logger.warning(f"⚠️ {breaker.name} call failed ({e.__class__.__name__}), retrying")
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+        except Exception:
+            # Cualquier otro error también cuenta como resultado: libera la llamada de prueba en half_open
+            breaker.record_failure()
+            raise
+
+        # 429: la petición no se procesó, se puede repetir (también POST) tras la espera indicada
+        if response.status_code == 429 and limiter is not None and limiter.throttle_on_429:
+            breaker.record_success()
+            wait = limiter.throttle(response.headers.get("Retry-After"))
+            if throttled_retries >= limiter.max_retries or wait > limiter.max_wait:
+                return response
+            logger.warning(f"⚠️ {breaker.name} returned HTTP 429, retrying in {wait:.1f}s")
+            response.close()
+            throttled_retries += 1
+            continue
+
+        # 5xx cuenta como falla del servicio; 4xx es un error del llamador
+        if response.status_code >= 500:
+            breaker.record_failure()
+            if last_attempt:
+                return response
+            logger.warning(f"⚠️ {breaker.name} returned HTTP {response.status_code}, retrying")
+            response.close()
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+
+        breaker.record_success()
+        return response
+
+# ===== LIMITADOR DE TASA =====
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """La espera en cola superaría el máximo configurado"""
+
+def parse_retry_after(value):
+    """Segundos indicados por Retry-After (número o fecha HTTP); None si no es válido"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Token bucket compartido: cada llamada reserva un token y espera su turno en orden"""
+
+    def __init__(self, name, rate, burst, max_wait, max_retries, throttle_on_429=True):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.throttle_on_429 = throttle_on_429
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._stats = {"acquired": 0, "throttled": 0, "rejected": 0, "rate_limited_responses": 0,
+                       "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    def acquire(self):
+        """Reservar un token esperando si hace falta; RateLimitExceeded si la espera es excesiva"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            # Los tokens pueden quedar negativos: esa deuda es la cola de llamadas en espera
+            wait = max((1 - self._tokens) / self.rate if self._tokens < 1 else 0.0, self._blocked_until - now)
+            if wait > self.max_wait:
+                self._stats["rejected"] += 1
+                raise RateLimitExceeded(f"Demasiadas solicitudes a {self.name}, intenta en unos segundos")
+
+            self._tokens -= 1
+            self._stats["acquired"] += 1
+            if wait > 0:
+                wait_ms = wait * 1000
+                self._stats["throttled"] += 1
+                self._stats["total_wait_ms"] += wait_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def try_acquire(self):
+        """Tomar un token sin esperar; retorna 0 si se tomó o los segundos hasta que haya uno"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            wait = max((1 - self._tokens) / self.rate if self._tokens < 1 else 0.0, self._blocked_until - now)
+            if wait > 0:
+                return wait
+
+            self._tokens -= 1
+            self._stats["acquired"] += 1
+            return 0.0
+
+    def throttle(self, retry_after):
+        """Registrar un 429 y bloquear el bucket el tiempo indicado; retorna la espera en segundos"""
+        wait = parse_retry_after(retry_after)
+        if wait is None:
+            wait = 1 / self.rate
+
+        with self._lock:
+            self._stats["rate_limited_responses"] += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+            self._tokens = min(self._tokens, 0.0)
+        return wait
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["total_wait_ms"] = round(stats["total_wait_ms"], 1)
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 1)
+        stats["avg_wait_ms"] = round(stats["total_wait_ms"] / stats["throttled"], 1) if stats["throttled"] else 0
+        stats["rate_per_second"] = self.rate
+        return stats
+
+# Límites por servicio
+RATE_LIMITS = {
+    # La cuota de NocoDB es de todo el despliegue: cada worker de gunicorn toma su parte
+    "nocodb": lambda: (NOCODB_RATE_LIMIT / WEB_CONCURRENCY, NOCODB_RATE_BURST // WEB_CONCURRENCY,
+                       NOCODB_RATE_MAX_WAIT, NOCODB_429_RETRIES),
+    # Límite global del bot (por token, repartido entre workers); los 429 de Telegram los maneja el dispatcher
+    "telegram": lambda: (TELEGRAM_GLOBAL_RATE / WEB_CONCURRENCY, TELEGRAM_GLOBAL_RATE // WEB_CONCURRENCY,
+                         TELEGRAM_MAX_QUEUE_WAIT, 0)
+}
+
+# Servicios cuyo 429 no bloquea el limitador global: Telegram limita por chat y el dispatcher pausa solo ese chat
+LOCAL_429_SERVICES = {"telegram"}
+
+_limiters = {}
+
+def get_rate_limiter(name):
+    """Limitador del servicio, o None si no tiene límite configurado"""
+    with _breakers_lock:
+        if name not in _limiters:
+            limits = RATE_LIMITS.get(name)
+            rate, burst, max_wait, max_retries = limits() if limits else (0, 0, 0, 0)
+            _limiters[name] = (TokenBucket(name, rate, max(1, burst), max_wait, max_retries,
+                                           throttle_on_429=name not in LOCAL_429_SERVICES)
+                               if rate > 0 else None)
+        return _limiters[name]
+
+def get_rate_limiter_stats():
+    """Métricas de espera y llamadas limitadas para /health"""
+    with _breakers_lock:
+        limiters = [limiter for limiter in _limiters.values() if limiter is not None]
+    return {limiter.name: limiter.get_stats() for limiter in limiters}
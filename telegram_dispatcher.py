@@ -0,0 +1,218 @@
+# 📤 telegram_dispatcher.py - Envío de Mensajes a Telegram con Límite por Chat v1.0
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import requests
+from resilience import TokenBucket, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Errores en los que Telegram no recibió el mensaje (incluye CircuitOpenError y ConnectTimeout);
+# un ReadTimeout pudo ocurrir con el mensaje ya aceptado y reintentarlo lo duplicaría
+RETRYABLE_SEND_ERRORS = (requests.exceptions.ConnectionError, RateLimitExceeded)
+
+class _Shard:
+    """Mensajes pendientes de los chats asignados a un hilo de envío"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = OrderedDict()  # chat_id -> deque de mensajes, en orden de llegada
+        self.buckets = {}  # chat_id -> TokenBucket del chat
+
+class TelegramDispatcher:
+    """Cola de salida: orden por chat, límite por chat y unión de mensajes consecutivos del mismo chat"""
+
+    def __init__(self, post, workers, max_pending, chat_rate, chat_burst, max_retries, max_length, retry_delay=1.0):
+        self._post = post
+        self.workers = workers
+        self.max_pending = max_pending
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_length = max_length
+        self.retry_delay = retry_delay
+        self._shards = [_Shard() for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pending_count = 0
+        self._stats = {"submitted": 0, "sent": 0, "failed": 0, "merged": 0, "rejected": 0, "retried": 0,
+                       "rate_limited_responses": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    def start(self):
+        """Iniciar un hilo por shard (idempotente)"""
+        with self._lock:
+            if self._threads:
+                return False
+            for number, shard in enumerate(self._shards):
+                thread = threading.Thread(target=self._worker_loop, args=(shard,), name=f"telegram-sender-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        logger.info(f"📤 Telegram dispatcher started ({self.workers} senders, {self.chat_rate} msg/s per chat)")
+        return True
+
+    def is_running(self):
+        return bool(self._threads)
+
+    def submit(self, method, payload, mergeable=False):
+        """Encolar una llamada a la API; retorna un Future con el resultado de Telegram (None si falla)"""
+        with self._lock:
+            if self._pending_count >= self.max_pending:
+                self._stats["rejected"] += 1
+                return None
+            self._pending_count += 1
+            self._stats["submitted"] += 1
+
+        future = Future()
+        item = {
+            "method": method,
+            "payload": payload,
+            "mergeable": mergeable and method == "sendMessage",
+            "futures": [future],
+            "attempts": 0,
+            "enqueued_at": time.time()
+        }
+
+        chat_id = payload.get("chat_id")
+        shard = self._shards[hash(chat_id) % self.workers]
+        with shard.condition:
+            shard.pending.setdefault(chat_id, deque()).append(item)
+            shard.condition.notify()
+        return future
+
+    # ===== ENVÍO =====
+
+    def _next_batch(self, shard):
+        """Primer chat con cupo y su siguiente envío (uniendo mensajes consecutivos); espera si no hay"""
+        with shard.condition:
+            while True:
+                min_wait = None
+                for chat_id in list(shard.pending):
+                    bucket = shard.buckets.get(chat_id)
+                    if bucket is None:
+                        bucket = TokenBucket(f"telegram-chat-{chat_id}", self.chat_rate, self.chat_burst, 0, 0)
+                        shard.buckets[chat_id] = bucket
+
+                    wait = bucket.try_acquire()
+                    if wait > 0:
+                        min_wait = wait if min_wait is None else min(min_wait, wait)
+                        continue
+
+                    items = shard.pending.pop(chat_id)
+                    batch = self._merge(items)
+                    if items:
+                        # Al final: los demás chats del shard no esperan detrás de uno con muchos mensajes
+                        shard.pending[chat_id] = items
+                    return chat_id, batch
+
+                self._prune_buckets(shard)
+                shard.condition.wait(timeout=min_wait)
+
+    def _merge(self, items):
+        """Sacar el siguiente mensaje uniendo los siguientes fire-and-forget mientras quepan en uno"""
+        batch = items.popleft()
+        if not batch["mergeable"]:
+            return batch
+
+        merged = 0
+        text = batch["payload"]["text"]
+        while items and items[0]["mergeable"] and items[0]["payload"].get("parse_mode") == batch["payload"].get("parse_mode"):
+            candidate = f"{text}\n\n{items[0]['payload']['text']}"
+            if len(candidate) > self.max_length:
+                break
+            text = candidate
+            batch["futures"].extend(items.popleft()["futures"])
+            merged += 1
+
+        if merged:
+            batch = dict(batch, payload=dict(batch["payload"], text=text))
+            with self._lock:
+                self._stats["merged"] += merged
+                self._pending_count -= merged
+        return batch
+
+    def _prune_buckets(self, shard):
+        """Descartar límites de chats sin mensajes pendientes cuando crecen demasiado"""
+        if len(shard.buckets) > 1000:
+            for chat_id in [chat_id for chat_id in shard.buckets if chat_id not in shard.pending]:
+                del shard.buckets[chat_id]
+
+    def _requeue(self, shard, chat_id, batch, retry_after):
+        """Volver a poner el envío al frente del chat y pausar el chat lo indicado por Telegram"""
+        with self._lock:
+            self._stats["retried"] += 1
+        with shard.condition:
+            shard.buckets[chat_id].throttle(retry_after)
+            shard.pending.setdefault(chat_id, deque()).appendleft(batch)
+            shard.pending.move_to_end(chat_id, last=False)
+            shard.condition.notify()
+
+    def _worker_loop(self, shard):
+        while True:
+            chat_id, batch = self._next_batch(shard)
+            try:
+                result, retry_after = self._send(batch)
+            except Exception as e:
+                # Límite global agotado, circuito abierto o sin conexión: el mensaje no se envió, se reintenta
+                if isinstance(e, RETRYABLE_SEND_ERRORS) and batch["attempts"] < self.max_retries:
+                    delay = self._backoff(batch["attempts"])
+                    batch["attempts"] += 1
+                    logger.warning(f"⚠️ Telegram {batch['method']} error for chat {chat_id} ({e}), retrying in {delay:.1f}s")
+                    self._requeue(shard, chat_id, batch, delay)
+                    continue
+                logger.error(f"❌ Telegram {batch['method']} error for chat {chat_id}: {e}")
+                result, retry_after = None, None
+
+            if retry_after is not None and batch["attempts"] < self.max_retries:
+                batch["attempts"] += 1
+                logger.warning(f"⚠️ Telegram 429 for chat {chat_id}, retrying in {retry_after}s")
+                self._requeue(shard, chat_id, batch, retry_after)
+                continue
+
+            self._finish(batch, result)
+
+    def _backoff(self, attempt):
+        """Espera exponencial con jitter antes de reintentar un envío fallido"""
+        return self.retry_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _send(self, batch):
+        """Ejecutar la llamada; retorna (resultado o None, retry_after si Telegram respondió 429)"""
+        response = self._post(batch["method"], batch["payload"])
+
+        if response.status_code == 200:
+            return response.json().get("result", True), None
+
+        if response.status_code == 429:
+            with self._lock:
+                self._stats["rate_limited_responses"] += 1
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                retry_after = 1
+            return None, retry_after
+
+        logger.error(f"❌ Telegram {batch['method']} error: {response.status_code} - {response.text}")
+        return None, None
+
+    def _finish(self, batch, result):
+        wait_ms = (time.time() - batch["enqueued_at"]) * 1000
+        with self._lock:
+            self._pending_count -= 1
+            self._stats["sent" if result is not None else "failed"] += 1
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+
+        for future in batch["futures"]:
+            future.set_result(result)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, pending=self._pending_count)
+        done = stats["sent"] + stats["failed"]
+        stats["avg_wait_ms"] = round(stats["total_wait_ms"] / done, 1) if done else 0
+        stats["total_wait_ms"] = round(stats["total_wait_ms"], 1)
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 1)
+        return stats
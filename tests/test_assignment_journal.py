@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assignment_journal import AssignmentJournal
+
+
+class _FakeAssignmentsTable:
+    """Tabla de asignaciones: el primer POST se guarda pero el cliente recibe un timeout"""
+
+    def __init__(self, timeouts=1):
+        self.rows = []
+        self.timeouts = timeouts
+        self.posts = 0
+
+    def send_batch(self, payloads):
+        self.posts += 1
+        self.rows.extend(payloads)
+        if self.timeouts:
+            self.timeouts -= 1
+            return [{"success": False, "error": "Read timed out"} for _ in payloads]
+        return [{"success": True, "record": {}} for _ in payloads]
+
+    def check_delivered(self, payloads):
+        return [payload in self.rows for payload in payloads]
+
+
+def _journal(path, table):
+    return AssignmentJournal(str(path), table.send_batch, lambda entry, error: None, batch_size=50,
+                             max_attempts=5, retry_interval=0.01, linger=0, check_delivered=table.check_delivered)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_timeout_after_commit_creates_a_single_row(tmp_path):
+    table = _FakeAssignmentsTable()
+    journal = _journal(tmp_path / "assignments.jsonl", table)
+    journal.start()
+
+    journal.append({"order_number": "ORD-1", "commercial_ext": 7})
+
+    assert _wait_for(lambda: journal.get_stats()["pending"] == 0)
+    assert table.rows == [{"order_number": "ORD-1", "commercial_ext": 7}]
+    assert table.posts == 1
+    stats = journal.get_stats()
+    assert stats["already_delivered"] == 1
+    assert stats["delivered"] == 1
+
+
+def test_replayed_entry_already_in_nocodb_is_not_resent(tmp_path):
+    path = tmp_path / "assignments.jsonl"
+    payload = {"order_number": "ORD-2", "commercial_ext": 9}
+    # Caída entre el POST y el ack: la fila existe pero el journal no tiene ack
+    path.write_text('{"op":"enqueue","id":"a1","payload":{"order_number":"ORD-2","commercial_ext":9},'
+                    '"context":{},"created_at":0}\n', encoding="utf-8")
+    table = _FakeAssignmentsTable(timeouts=0)
+    table.rows.append(payload)
+
+    journal = _journal(path, table)
+    journal.start()
+
+    assert _wait_for(lambda: journal.get_stats()["pending"] == 0)
+    assert table.posts == 0
+    assert table.rows == [payload]
@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_snapshot import read_snapshot_timestamp, write_snapshot
+from client_store import ClientStore
+
+
+def _data(name):
+    clients = ClientStore(["nit", "nombre"])
+    clients.append({"nit": "9001", "nombre": name})
+    return {"clients": clients, "columns": [{"name": "nit"}, {"name": "nombre"}],
+            "doc_columns": ["nit"], "doc_index": {"9001": [(0, "nit")]}, "metadata": {}}
+
+
+def test_older_snapshot_does_not_replace_newer_one(tmp_path):
+    path = str(tmp_path / "clients.snap")
+
+    assert write_snapshot(path, _data("nuevo"), 200.0) > 0
+    assert write_snapshot(path, _data("viejo"), 100.0) is None
+
+    assert read_snapshot_timestamp(path) == 200.0
+
+
+def test_newer_snapshot_replaces_older_one(tmp_path):
+    path = str(tmp_path / "clients.snap")
+
+    write_snapshot(path, _data("viejo"), 100.0)
+    write_snapshot(path, _data("nuevo"), 200.0)
+
+    assert read_snapshot_timestamp(path) == 200.0
+
+
+def test_missing_snapshot_has_no_timestamp(tmp_path):
+    assert read_snapshot_timestamp(str(tmp_path / "missing.snap")) is None
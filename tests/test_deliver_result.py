@@ -0,0 +1,47 @@
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_fallback_is_sent_on_caller_thread_when_edit_fails(monkeypatch):
+    sent = []
+
+    def send(chat_id, text, parse_mode=None, wait=False):
+        sent.append((threading.current_thread(), text, wait))
+        return True
+
+    monkeypatch.setattr(utils, "edit_telegram_message", lambda *args: _done(None))
+    monkeypatch.setattr(utils, "send_telegram_message", send)
+
+    assert utils.deliver_result(1, _done({"message_id": 7}), "resultado") is True
+    assert sent == [(threading.current_thread(), "resultado", True)]
+
+
+def test_no_fallback_when_edit_succeeds(monkeypatch):
+    sent = []
+    monkeypatch.setattr(utils, "edit_telegram_message", lambda *args: _done({"message_id": 7}))
+    monkeypatch.setattr(utils, "send_telegram_message", lambda *args, **kwargs: sent.append(args))
+
+    assert utils.deliver_result(1, _done({"message_id": 7}), "resultado") is True
+    assert sent == []
+
+
+def test_no_fallback_when_edit_times_out(monkeypatch):
+    sent = []
+    monkeypatch.setattr(utils, "TELEGRAM_EDIT_WAIT", 0.01)
+    monkeypatch.setattr(utils, "edit_telegram_message", lambda *args: Future())
+    monkeypatch.setattr(utils, "send_telegram_message", lambda *args, **kwargs: sent.append(args))
+
+    assert utils.deliver_result(1, _done({"message_id": 7}), "resultado") is False
+    assert sent == []
@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nocodb_service
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class _PagedSession:
+    """Devuelve los registros en páginas de tamaño fijo, como NocoDB con límite de página"""
+
+    def __init__(self, records, page_size):
+        self.records = records
+        self.page_size = page_size
+        self.calls = 0
+
+    def get(self, url, params=None, **kwargs):
+        self.calls += 1
+        offset = params["offset"]
+        page = self.records[offset:offset + self.page_size]
+        return _Response({"list": page, "pageInfo": {"isLastPage": offset + len(page) >= len(self.records)}})
+
+
+def test_fetch_existing_cedulas_follows_pages(monkeypatch):
+    session = _PagedSession([{"cedula": "1001"}, {"cedula": "1001"}, {"cedula": "1002"}, {"cedula": "1003"}], page_size=2)
+    monkeypatch.setattr(nocodb_service, "get_http_session", lambda upstream: session)
+
+    existing = nocodb_service.fetch_existing_cedulas(["1001", "1002", "1003"])
+
+    assert existing == {"1001", "1002", "1003"}
+    assert session.calls == 2
+
+
+def test_find_recorded_assignments_matches_order_and_comercial(monkeypatch):
+    session = _PagedSession([{"order_number": "ORD-1", "commercial_ext": 7},
+                             {"order_number": "ORD-2", "commercial_ext": 3}], page_size=1)
+    monkeypatch.setattr(nocodb_service, "get_http_session", lambda upstream: session)
+
+    found = nocodb_service._find_recorded_assignments([
+        {"order_number": "ORD-1", "commercial_ext": 7},
+        {"order_number": "ORD-2", "commercial_ext": 5},
+        {"order_number": "ORD-3", "commercial_ext": 7}
+    ])
+
+    assert found == [True, False, False]
+    assert session.calls == 2
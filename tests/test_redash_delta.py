@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_store import ClientStore
+from redash_service import build_document_index, merge_delta_rows
+
+
+class _WatchedIndex(dict):
+    """Índice que registra cada clave que deja de existir"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.removed = []
+
+    def pop(self, key, *default):
+        self.removed.append(key)
+        return super().pop(key, *default)
+
+    def __delitem__(self, key):
+        self.removed.append(key)
+        super().__delitem__(key)
+
+
+def _dataset(rows):
+    clients = ClientStore(["nit", "nombre", "cedula"])
+    for row in rows:
+        clients.append(row)
+    doc_columns = ["nit", "cedula"]
+    return {"clients": clients, "doc_columns": doc_columns,
+            "doc_index": _WatchedIndex(build_document_index(clients, doc_columns))}
+
+
+def test_update_keeps_unchanged_document_key_in_index():
+    data = _dataset([{"nit": "900-1", "nombre": "A", "cedula": "11"}, {"nit": "900-2", "nombre": "B"}])
+
+    inserted, updated = merge_delta_rows(data, [{"nit": "900-1", "nombre": "A2", "cedula": "12"}])
+
+    assert (inserted, updated) == (0, 1)
+    assert data["doc_index"]["9001"] == [(0, "nit")]
+    assert data["doc_index"]["12"] == [(0, "cedula")]
+    assert "11" not in data["doc_index"]
+    # La clave que la fila conserva nunca se quitó del índice
+    assert data["doc_index"].removed == ["11"]
+    assert data["clients"][0]["nombre"] == "A2"
+
+
+def test_insert_adds_row_and_index_entries():
+    data = _dataset([{"nit": "900-1", "nombre": "A"}])
+
+    assert merge_delta_rows(data, [{"nit": "900-3", "nombre": "C"}]) == (1, 0)
+    assert data["doc_index"]["9003"] == [(1, "nit")]
+
+
+def test_client_store_copy_is_isolated_from_later_merges():
+    data = _dataset([{"nit": "900-1", "nombre": "A"}])
+    frozen = data["clients"].copy()
+
+    merge_delta_rows(data, [{"nit": "900-1", "nombre": "A2"}, {"nit": "900-3", "nombre": "C"}])
+
+    assert len(frozen) == 1
+    assert frozen[0]["nombre"] == "A"
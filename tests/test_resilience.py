@@ -0,0 +1,127 @@
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import CircuitBreaker, CircuitOpenError, call_upstream
+
+
+class _Response:
+    status_code = 200
+    headers = {}
+
+    def close(self):
+        pass
+
+
+def _open_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.get_stats()["state"] == "open"
+    return breaker
+
+
+def test_half_open_probe_with_non_connection_error_reopens_circuit():
+    breaker = _open_breaker()
+
+    def send():
+        raise requests.exceptions.ChunkedEncodingError("connection broken")
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        call_upstream(breaker, "POST", send)
+
+    stats = breaker.get_stats()
+    assert stats["state"] == "open"
+    assert stats["rejected"] == 0
+
+    # Pasado el reset_timeout se permite una nueva prueba en lugar de rechazar para siempre
+    assert call_upstream(breaker, "POST", _Response).status_code == 200
+    assert breaker.get_stats()["state"] == "closed"
+
+
+def test_half_open_rejects_concurrent_calls_while_probe_in_flight():
+    breaker = _open_breaker()
+    breaker.before_call()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+class _RateLimitedResponse(_Response):
+    status_code = 429
+    headers = {"Retry-After": "40"}
+
+
+def test_local_429_does_not_block_the_shared_limiter():
+    from resilience import TokenBucket
+
+    breaker = CircuitBreaker("telegram-test", failure_threshold=5, reset_timeout=30)
+    limiter = TokenBucket("telegram-test", rate=30, burst=30, max_wait=1, max_retries=0, throttle_on_429=False)
+
+    assert call_upstream(breaker, "POST", _RateLimitedResponse, limiter=limiter).status_code == 429
+    # Otro chat puede enviar de inmediato: el 429 no bloqueó el límite global del bot
+    assert call_upstream(breaker, "POST", _Response, limiter=limiter).status_code == 200
+    assert limiter.get_stats()["rate_limited_responses"] == 0
+
+
+def test_nocodb_rate_is_split_across_gunicorn_workers(monkeypatch):
+    import resilience
+
+    monkeypatch.setattr(resilience, "_limiters", {})
+    monkeypatch.setattr(resilience, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(resilience, "NOCODB_RATE_LIMIT", 8.0)
+    monkeypatch.setattr(resilience, "NOCODB_RATE_BURST", 10)
+
+    limiter = resilience.get_rate_limiter("nocodb")
+
+    assert limiter.rate == 2.0
+    assert limiter.burst == 2
+
+
+def test_read_timeout_is_not_retried():
+    breaker = CircuitBreaker("slow", failure_threshold=5, reset_timeout=30)
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        call_upstream(breaker, "GET", send)
+
+    assert len(calls) == 1
+    assert breaker.get_stats()["failures"] == 1
+
+
+def test_connection_error_is_retried_for_reads(monkeypatch):
+    import resilience
+
+    monkeypatch.setattr(resilience, "retry_delay", lambda attempt: 0)
+    breaker = CircuitBreaker("flaky", failure_threshold=5, reset_timeout=30)
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectTimeout("connect timed out")
+        return _Response()
+
+    assert call_upstream(breaker, "GET", send).status_code == 200
+    assert len(calls) == 2
+
+
+def test_telegram_global_rate_is_split_across_gunicorn_workers(monkeypatch):
+    import resilience
+
+    monkeypatch.setattr(resilience, "_limiters", {})
+    monkeypatch.setattr(resilience, "WEB_CONCURRENCY", 3)
+    monkeypatch.setattr(resilience, "TELEGRAM_GLOBAL_RATE", 30.0)
+
+    limiter = resilience.get_rate_limiter("telegram")
+
+    assert limiter.rate == 10.0
+    assert limiter.burst == 10
+    assert limiter.throttle_on_429 is False
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram_dispatcher import TelegramDispatcher
+
+
+class _Response:
+    status_code = 200
+
+    def json(self):
+        return {"ok": True, "result": {"message_id": 1}}
+
+
+def _dispatcher(post, max_retries=3):
+    dispatcher = TelegramDispatcher(post, workers=1, max_pending=10, chat_rate=100, chat_burst=10,
+                                    max_retries=max_retries, max_length=4000, retry_delay=0.01)
+    dispatcher.start()
+    return dispatcher
+
+
+def test_send_error_is_requeued_instead_of_dropped():
+    calls = []
+
+    def post(method, payload):
+        calls.append(method)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectionError("network down")
+        return _Response()
+
+    dispatcher = _dispatcher(post)
+    future = dispatcher.submit("sendMessage", {"chat_id": 1, "text": "hola"})
+
+    assert future.result(timeout=5) == {"message_id": 1}
+    assert len(calls) == 2
+    stats = dispatcher.get_stats()
+    assert stats["retried"] == 1
+    assert stats["sent"] == 1
+
+
+def test_send_error_fails_after_max_retries():
+    def post(method, payload):
+        raise requests.exceptions.ConnectionError("network down")
+
+    dispatcher = _dispatcher(post, max_retries=2)
+    future = dispatcher.submit("sendMessage", {"chat_id": 1, "text": "hola"})
+
+    assert future.result(timeout=5) is None
+    stats = dispatcher.get_stats()
+    assert stats["retried"] == 2
+    assert stats["failed"] == 1
+
+
+def test_read_timeout_is_not_retried():
+    calls = []
+
+    def post(method, payload):
+        calls.append(method)
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    dispatcher = _dispatcher(post)
+    future = dispatcher.submit("sendMessage", {"chat_id": 1, "text": "hola"})
+
+    assert future.result(timeout=5) is None
+    assert len(calls) == 1
+    assert dispatcher.get_stats()["retried"] == 0
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_queue import UpdateQueue
+
+
+def _queue(handler, workers=2, max_size=10):
+    update_queue = UpdateQueue(handler, workers, max_size, key=lambda update: update["user"])
+    update_queue.start()
+    return update_queue
+
+
+def test_slow_user_does_not_block_other_users():
+    release = threading.Event()
+    other_done = threading.Event()
+
+    def handler(update):
+        if update["user"] == "lento":
+            release.wait(timeout=5)
+        else:
+            other_done.set()
+
+    update_queue = _queue(handler)
+    update_queue.submit({"user": "lento"})
+    # Con un hash fijo por shard estos usuarios podían quedar detrás del lento
+    for number in range(5):
+        update_queue.submit({"user": f"otro-{number}"})
+
+    assert other_done.wait(timeout=2)
+    release.set()
+
+
+def test_updates_of_one_user_run_in_order_and_one_at_a_time():
+    processed = []
+    running = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def handler(update):
+        with lock:
+            if update["user"] in running:
+                overlaps.append(update)
+            running.add(update["user"])
+        processed.append(update["n"])
+        with lock:
+            running.discard(update["user"])
+
+    update_queue = _queue(handler, workers=4, max_size=20)
+    for number in range(20):
+        update_queue.submit({"user": "mismo", "n": number})
+
+    for _ in range(200):
+        if update_queue.get_stats()["processed"] == 20:
+            break
+        threading.Event().wait(0.01)
+
+    assert processed == list(range(20))
+    assert overlaps == []
+
+
+def test_submit_rejects_when_full():
+    release = threading.Event()
+    update_queue = _queue(lambda update: release.wait(timeout=5), workers=1, max_size=2)
+
+    results = [update_queue.submit({"user": "a"}) for _ in range(4)]
+    release.set()
+
+    assert results.count(False) >= 1
+    assert update_queue.get_stats()["rejected"] == results.count(False)
@@ -1,52 +1,259 @@
 # 🔧 utils.py - Utilidades y Helpers v1.0
-import requests
 import logging
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from config import *
+from http_client import get_http_session
+from telegram_dispatcher import TelegramDispatcher
 
 logger = logging.getLogger(__name__)
 
-def send_telegram_message(chat_id, text, parse_mode=None):
-    """Enviar mensaje a Telegram optimizado"""
+# ===== SINGLE-FLIGHT =====
+
+class _FlightCall:
+    """Llamada en curso compartida por todos los hilos que piden la misma clave"""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalescer llamadas concurrentes con la misma clave: un hilo ejecuta y el resto espera su resultado"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Ejecutar fn una sola vez por clave entre los hilos concurrentes"""
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["coalesced"] += 1
+                is_leader = False
+            else:
+                call = _FlightCall()
+                self._calls[key] = call
+                self._stats["executions"] += 1
+                is_leader = True
+
+        if not is_leader:
+            logger.info(f"🔗 Coalesced call {self.name}:{key}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def get_stats(self):
+        """Contadores de llamadas, ejecuciones reales y llamadas coalescidas"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+_single_flights = {}
+_single_flights_lock = threading.Lock()
+
+def get_single_flight(name):
+    """Obtener (o crear) el grupo single-flight con el nombre dado"""
+    with _single_flights_lock:
+        flight = _single_flights.get(name)
+        if flight is None:
+            flight = SingleFlight(name)
+            _single_flights[name] = flight
+        return flight
+
+def get_single_flight_stats():
+    """Contadores de todos los grupos single-flight"""
+    with _single_flights_lock:
+        flights = list(_single_flights.values())
+    return {flight.name: flight.get_stats() for flight in flights}
+
+# ===== LOOKUPS VERIFICADOS =====
+
+def create_verified_lookup(kind, key, payload):
+    """Token de una consulta ya verificada para reutilizar en pasos siguientes"""
+    return {"kind": kind, "key": key, "payload": payload, "verified_at": time.time()}
+
+def get_verified_lookup(token, kind, key):
+    """Payload del token si corresponde a la misma consulta y no ha expirado; None si hay que verificar"""
+    if not isinstance(token, dict):
+        return None
+    
+    if token.get("kind") != kind or token.get("key") != key:
+        return None
+    
+    if time.time() - token.get("verified_at", 0) >= VERIFIED_LOOKUP_TTL:
+        return None
+    
+    return token.get("payload")
+
+# ===== ENVÍO DE MENSAJES TELEGRAM =====
+
+def _post_telegram(method, payload):
+    """Llamar un método de la API de Telegram"""
+    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/{method}"
+    return get_http_session("telegram").post(url, json=payload, timeout=TELEGRAM_TIMEOUT)
+
+telegram_dispatcher = TelegramDispatcher(
+    _post_telegram,
+    workers=TELEGRAM_SENDER_WORKERS,
+    max_pending=TELEGRAM_OUTBOX_SIZE,
+    chat_rate=TELEGRAM_CHAT_RATE,
+    chat_burst=TELEGRAM_CHAT_BURST,
+    max_retries=TELEGRAM_429_RETRIES,
+    max_length=MAX_MESSAGE_LENGTH,
+    retry_delay=TELEGRAM_RETRY_DELAY
+)
+
+def start_telegram_dispatcher():
+    """Iniciar los hilos de envío de mensajes a Telegram"""
+    if not TELEGRAM_DISPATCHER_ENABLED:
+        logger.info("ℹ️ Telegram dispatcher disabled, sending synchronously")
+        return False
+    return telegram_dispatcher.start()
+
+def get_telegram_dispatcher_stats():
+    """Estado de la cola de salida para /health"""
+    if not TELEGRAM_DISPATCHER_ENABLED:
+        return {"enabled": False}
+    return dict(telegram_dispatcher.get_stats(), enabled=True)
+
+def send_telegram_message(chat_id, text, parse_mode=None, wait=False):
+    """Enviar mensaje a Telegram (encolado; con wait=True espera la confirmación de envío)"""
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        data = {"chat_id": chat_id, "text": text}
-        if parse_mode:
-            data["parse_mode"] = parse_mode
-        
         # Dividir mensaje si es muy largo
-        if len(text) > MAX_MESSAGE_LENGTH:
-            chunks = split_long_message(text)
+        chunks = split_long_message(text) if len(text) > MAX_MESSAGE_LENGTH else [text]
+        payloads = []
+        for chunk in chunks:
+            data = {"chat_id": chat_id, "text": chunk}
+            if parse_mode:
+                data["parse_mode"] = parse_mode
+            payloads.append(data)
+        
+        if not telegram_dispatcher.is_running():
             success = True
-            for chunk in chunks:
-                chunk_data = {"chat_id": chat_id, "text": chunk}
-                if parse_mode:
-                    chunk_data["parse_mode"] = parse_mode
-                response = requests.post(url, json=chunk_data, timeout=TELEGRAM_TIMEOUT)
+            for data in payloads:
+                response = _post_telegram("sendMessage", data)
                 if response.status_code != 200:
                     success = False
-                    logger.error(f"❌ Telegram chunk error: {response.status_code}")
+                    logger.error(f"❌ Telegram send error: {response.status_code}")
             return success
-        else:
-            response = requests.post(url, json=data, timeout=TELEGRAM_TIMEOUT)
-            return response.status_code == 200
+        
+        # Los fragmentos se encolan juntos: el dispatcher respeta el orden del chat
+        futures = [telegram_dispatcher.submit("sendMessage", data, mergeable=not wait) for data in payloads]
+        if any(future is None for future in futures):
+            logger.error(f"❌ Telegram outbox full, message to chat {chat_id} dropped")
+            return False
+        
+        if not wait:
+            return True
+        return all(future.result(timeout=TELEGRAM_MAX_QUEUE_WAIT + TELEGRAM_TIMEOUT) is not None for future in futures)
             
     except Exception as e:
         logger.error(f"❌ Telegram error: {e}")
         return False
 
+# ===== MENSAJES DE PROGRESO =====
+
+def _call_telegram(method, payload):
+    """Llamar la API (por el dispatcher si está activo); retorna un Future con el resultado o None"""
+    if telegram_dispatcher.is_running():
+        future = telegram_dispatcher.submit(method, payload)
+        if future is not None:
+            return future
+        logger.error(f"❌ Telegram outbox full, {method} to chat {payload.get('chat_id')} dropped")
+    
+    future = Future()
+    result = None
+    if not telegram_dispatcher.is_running():
+        try:
+            response = _post_telegram(method, payload)
+            if response.status_code == 200:
+                result = response.json().get("result", True)
+            else:
+                logger.error(f"❌ Telegram {method} error: {response.status_code} - {response.text}")
+        except Exception as e:
+            logger.error(f"❌ Telegram {method} error: {e}")
+    future.set_result(result)
+    return future
+
+def send_progress_message(chat_id, text, parse_mode=None):
+    """Enviar mensaje de progreso sin esperar; retorna un Future con el mensaje (para editarlo luego)"""
+    payload = {"chat_id": chat_id, "text": text}
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    return _call_telegram("sendMessage", payload)
+
+def edit_telegram_message(chat_id, message_id, text, parse_mode=None):
+    """Reemplazar el texto de un mensaje ya enviado; retorna un Future con el resultado"""
+    payload = {"chat_id": chat_id, "message_id": message_id, "text": text}
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    return _call_telegram("editMessageText", payload)
+
+def deliver_result(chat_id, progress, text, parse_mode=None):
+    """Mostrar el resultado editando el mensaje de progreso; mensaje nuevo si no cabe o la edición falla"""
+    if progress is None or len(text) > MAX_MESSAGE_LENGTH:
+        return send_telegram_message(chat_id, text, parse_mode)
+    
+    try:
+        message = progress.result(timeout=TELEGRAM_MAX_QUEUE_WAIT + TELEGRAM_TIMEOUT)
+    except Exception as e:
+        logger.error(f"❌ Progress message not available: {e}")
+        message = None
+    
+    if not isinstance(message, dict) or not message.get("message_id"):
+        return send_telegram_message(chat_id, text, parse_mode)
+    
+    # Se espera la edición en el hilo del handler: el respaldo llega antes de la siguiente interacción
+    try:
+        edited = edit_telegram_message(chat_id, message["message_id"], text, parse_mode).result(timeout=TELEGRAM_EDIT_WAIT)
+    except FutureTimeoutError:
+        # La edición sigue en la cola del chat y saldrá después: un mensaje nuevo duplicaría el resultado
+        logger.error(f"❌ Edit of message {message['message_id']} in chat {chat_id} not confirmed after {TELEGRAM_EDIT_WAIT}s")
+        return False
+    
+    if edited is not None:
+        return True
+    
+    logger.warning(f"⚠️ Could not edit message {message['message_id']} in chat {chat_id}, sending new one")
+    success = send_telegram_message(chat_id, text, parse_mode, wait=True)
+    if not success:
+        logger.error(f"❌ Result for chat {chat_id} could not be delivered")
+    return success
+
 def setup_webhook():
     """Configurar webhook de Telegram"""
     try:
         # Delete webhook primero
         delete_url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/deleteWebhook"
-        requests.post(delete_url, timeout=WEBHOOK_TIMEOUT)
+        get_http_session("telegram").post(delete_url, timeout=WEBHOOK_TIMEOUT)
         
         # Set nuevo webhook
         webhook_url = f"{WEBHOOK_URL}/telegram-webhook"
         set_url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/setWebhook"
         data = {"url": webhook_url}
         
-        response = requests.post(set_url, json=data, timeout=WEBHOOK_TIMEOUT)
+        response = get_http_session("telegram").post(set_url, json=data, timeout=WEBHOOK_TIMEOUT)
         
         if response.status_code == 200:
             result = response.json()
@@ -67,7 +274,7 @@ def validate_telegram_token():
     
     try:
         url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getMe"
-        response = requests.get(url, timeout=WEBHOOK_TIMEOUT)
+        response = get_http_session("telegram").get(url, timeout=WEBHOOK_TIMEOUT)
         return response.status_code == 200 and response.json().get('ok', False)
     except:
         return False
@@ -286,7 +493,7 @@ def log_performance(func_name, start_time, additional_info=""):
 def get_client_summary_text(client_data):
     """Generar resumen textual de cliente"""
     try:
-        if not isinstance(client_data, dict):
+        if not isinstance(client_data, Mapping):
             return "Datos de cliente inválidos"
         
         # Campos prioritarios para mostrar
@@ -0,0 +1,172 @@
+# 📥 webhook_queue.py - Cola de Updates de Telegram con Pool de Workers v1.3
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+class UpdateQueue:
+    """Cola acotada con orden por clave: los updates de un mismo usuario se procesan en orden, usuarios distintos en paralelo"""
+
+    def __init__(self, handler, workers, max_size, key=None, name="telegram-update"):
+        self._handler = handler
+        self._key = key
+        self.workers = workers
+        self.max_size = max_size
+        self.name = name
+        # Pool compartido: una clave está en ejecución o en _ready a lo sumo una vez, así
+        # dos updates del mismo usuario nunca corren a la vez y un usuario lento solo se retrasa a sí mismo
+        self._condition = threading.Condition()
+        self._pending = {}  # clave -> deque de (enqueued_at, update), en orden de llegada
+        self._ready = deque()  # claves con updates listos para un worker libre
+        self._scheduled = set()  # claves en _ready o en ejecución
+        self._depth = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._stats = {"enqueued": 0, "processed": 0, "rejected": 0, "errors": 0,
+                       "max_depth": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    def start(self):
+        """Iniciar los hilos del pool (idempotente)"""
+        with self._lock:
+            if self._threads:
+                return False
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"{self.name}-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        logger.info(f"📥 {self.name} queue started ({self.workers} workers, max {self.max_size} pending)")
+        return True
+
+    def key_for(self, update):
+        """Clave de orden de un update (usuario/chat); None agrupa los updates sin clave"""
+        return self._key(update) if self._key else None
+
+    def submit(self, update):
+        """Encolar un update sin bloquear; False si la cola está llena"""
+        key = self.key_for(update)
+        with self._condition:
+            if self._depth >= self.max_size:
+                rejected = True
+            else:
+                rejected = False
+                self._pending.setdefault(key, deque()).append((time.time(), update))
+                self._depth += 1
+                depth = self._depth
+                if key not in self._scheduled:
+                    self._scheduled.add(key)
+                    self._ready.append(key)
+                    self._condition.notify()
+
+        if rejected:
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning(f"⚠️ {self.name} queue full ({self.max_size}), rejecting update")
+            return False
+
+        with self._lock:
+            self._stats["enqueued"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+        return True
+
+    def _next_update(self):
+        """Siguiente update de la primera clave lista; espera si no hay"""
+        with self._condition:
+            while not self._ready:
+                self._condition.wait()
+            key = self._ready.popleft()
+            items = self._pending[key]
+            enqueued_at, update = items.popleft()
+            if not items:
+                del self._pending[key]
+            self._depth -= 1
+            return key, enqueued_at, update
+
+    def _release(self, key):
+        """Devolver la clave al final de la fila si tiene más updates; si no, liberarla"""
+        with self._condition:
+            if key in self._pending:
+                # Al final: los demás usuarios no esperan detrás de uno con muchos updates
+                self._ready.append(key)
+                self._condition.notify()
+            else:
+                self._scheduled.discard(key)
+
+    def _worker_loop(self):
+        while True:
+            key, enqueued_at, update = self._next_update()
+            wait_ms = (time.time() - enqueued_at) * 1000
+
+            with self._lock:
+                self._busy += 1
+                self._stats["total_wait_ms"] += wait_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+
+            try:
+                self._handler(update)
+            except Exception as e:
+                logger.error(f"❌ {self.name} worker error: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._stats["processed"] += 1
+                self._release(key)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["busy_workers"] = self._busy
+        with self._condition:
+            stats["depth"] = self._depth
+            stats["queued_keys"] = len(self._pending)
+            stats["deepest_key"] = max((len(items) for items in self._pending.values()), default=0)
+        stats["workers"] = self.workers
+        stats["max_size"] = self.max_size
+        stats["avg_wait_ms"] = round(stats["total_wait_ms"] / stats["processed"], 1) if stats["processed"] else 0
+        stats["total_wait_ms"] = round(stats["total_wait_ms"], 1)
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 1)
+        return stats
+
+class RecentUpdateIds:
+    """update_id vistos en la ventana reciente (acotados) para descartar reenvíos de Telegram"""
+
+    def __init__(self, window, max_ids):
+        self.window = window
+        self.max_ids = max_ids
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # update_id -> momento en que llegó (orden de llegada)
+        self._stats = {"checked": 0, "duplicates_suppressed": 0}
+
+    def check_and_add(self, update_id):
+        """True si el update ya se vio en la ventana; si no, lo registra"""
+        now = time.time()
+        with self._lock:
+            self._stats["checked"] += 1
+
+            # Expirar por antigüedad y por tamaño desde el más viejo
+            while self._seen:
+                oldest_id, seen_at = next(iter(self._seen.items()))
+                if now - seen_at < self.window and len(self._seen) < self.max_ids:
+                    break
+                del self._seen[oldest_id]
+
+            if update_id in self._seen:
+                self._stats["duplicates_suppressed"] += 1
+                return True
+
+            self._seen[update_id] = now
+            return False
+
+    def discard(self, update_id):
+        """Olvidar un update que no se pudo aceptar, para procesar su reenvío"""
+        with self._lock:
+            self._seen.pop(update_id, None)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, tracked=len(self._seen), window_seconds=self.window)